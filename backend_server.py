@@ -4,10 +4,15 @@ YouTube Video Engine - Backend Server
 Handles UI requests, file uploads, rendering coordination, and notifications
 """
 
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Request, Response, g, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
+import base64
+import bisect
+import hashlib
+import hmac
 import json
 import logging
+import math
 import os
 import subprocess
 import sys
@@ -18,12 +23,27 @@ import re
 import shutil
 import uuid
 import requests
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import quote, urljoin, urlparse
 import smtplib
+import sqlite3
+import tempfile
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
+
+try:
+    import numpy as np
+except ImportError:  # optional: subtitle generation falls back to pure Python
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: single-process dev server, always the queue leader
+    fcntl = None
 
 # Force unbuffered stdout/stderr so logs appear immediately on VPS
 if not sys.stdout.line_buffering:
@@ -42,10 +62,10 @@ logger = logging.getLogger('yve-render')
 app = Flask(__name__)
 CORS(app)
 
-# Configuration
+# Configuration (data directories can be moved with YVE_UPLOAD_DIR / YVE_OUTPUT_DIR)
 BASE_DIR = Path(__file__).parent
-UPLOAD_DIR = BASE_DIR / 'uploads'
-OUTPUT_DIR = BASE_DIR / 'output'
+UPLOAD_DIR = Path(os.environ.get('YVE_UPLOAD_DIR') or (BASE_DIR / 'uploads'))
+OUTPUT_DIR = Path(os.environ.get('YVE_OUTPUT_DIR') or (BASE_DIR / 'output'))
 CONFIG_FILE = BASE_DIR / 'config.json'
 
 # Lovable render endpoint auth (used only for /api/lovable-render*)
@@ -61,8 +81,118 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 LOVABLE_TEMP_DIR = UPLOAD_DIR / 'temp' / 'lovable'
 LOVABLE_TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
-# Track Lovable render jobs (separate from existing render_status)
-lovable_render_jobs = {}
+# Persistent state (job status + render queue), how long finished jobs are
+# kept, and the number of renders allowed to run at once
+STATE_DB = Path(os.environ.get('YVE_STATE_DB') or (BASE_DIR / 'yve_state.db'))
+JOB_STATE_TTL = int(float(os.environ.get('YVE_JOB_TTL_HOURS', '72')) * 3600)
+RENDER_QUEUE_WORKERS = int(os.environ.get('YVE_RENDER_WORKERS', '1'))
+
+# Multi-process serving (gunicorn.conf.py): one id per server start, shared by
+# every worker so start-up recovery runs once; job rows written by other
+# processes are pulled into this process's cache every JOB_SYNC_INTERVAL.
+SERVER_BOOT_ID = os.environ.get('YVE_BOOT_ID') or uuid.uuid4().hex
+# Secret shared by the workers of one server start and never written to disk:
+# seals client credentials in the render queue (see _seal_secret)
+SERVER_SECRET = bytes.fromhex(os.environ['YVE_SERVER_SECRET']) if os.environ.get('YVE_SERVER_SECRET') else os.urandom(32)
+JOB_SYNC_INTERVAL = 0.5
+
+# Scene asset downloads for Lovable renders: total concurrent fetches, and a
+# cap per remote host so one storage bucket is not hammered.
+LOVABLE_DOWNLOAD_WORKERS = int(os.environ.get('YVE_DOWNLOAD_WORKERS', '8'))
+LOVABLE_DOWNLOAD_PER_HOST = int(os.environ.get('YVE_DOWNLOAD_PER_HOST', '4'))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Downloaded scene media and audio is kept (in the blob store) and revalidated
+# with ETag / Last-Modified on the next render; 0 disables the cache. URLs
+# under YVE_HTTP_CACHE_IMMUTABLE_PREFIXES (comma-separated), and responses
+# marked Cache-Control: immutable, are reused without asking the server.
+HTTP_CACHE_MAX_BYTES = int(float(os.environ.get('YVE_HTTP_CACHE_GB', '20')) * 1024 ** 3)
+HTTP_CACHE_IMMUTABLE_PREFIXES = tuple(
+    p.strip() for p in os.environ.get('YVE_HTTP_CACHE_IMMUTABLE_PREFIXES', '').split(',') if p.strip()
+)
+
+# Parallel segment encodes: ffmpeg workers = min(YVE_SEGMENT_WORKERS, cores),
+# and each worker's -threads is its share of the cores.
+SEGMENT_ENCODE_WORKERS = int(os.environ.get('YVE_SEGMENT_WORKERS', '4'))
+SEGMENT_TIMEOUT = 300
+
+# Content-addressed cache of encoded segments, shared by all renders and
+# evicted least-recently-used once it grows past YVE_SEGMENT_CACHE_GB.
+SEGMENT_CACHE_DIR = Path(os.environ.get('YVE_SEGMENT_CACHE_DIR') or (OUTPUT_DIR / '.segment_cache'))
+SEGMENT_CACHE_MAX_BYTES = int(float(os.environ.get('YVE_SEGMENT_CACHE_GB', '20')) * 1024 ** 3)
+SEGMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Named encoder profiles, selectable per job with "profile" in the
+# /api/lovable-render payload. 'draft' is for fast pacing previews.
+RENDER_PROFILES = {
+    'draft':    {'width': 960,  'height': 540,  'fps': 15, 'preset': 'ultrafast', 'crf': 30, 'audio_bitrate': '128k'},
+    'standard': {'width': 1920, 'height': 1080, 'fps': 25, 'preset': 'fast',      'crf': 23, 'audio_bitrate': '192k'},
+    'final':    {'width': 1920, 'height': 1080, 'fps': 25, 'preset': 'slow',      'crf': 18, 'audio_bitrate': '192k'},
+}
+DEFAULT_RENDER_PROFILE = os.environ.get('YVE_RENDER_PROFILE', 'standard')
+
+# Crossfade stitching: 'chunked' crossfades groups of YVE_XFADE_GROUP_SIZE
+# segments in parallel and joins them through separately encoded transitions; 'chain' builds one xfade
+# graph over every segment; 'boundary' encodes only the crossfade windows and
+# stream-copies segment bodies. A job can override it with "stitch_mode".
+STITCH_MODE = os.environ.get('YVE_STITCH_MODE', 'chunked')
+XFADE_GROUP_SIZE = int(os.environ.get('YVE_XFADE_GROUP_SIZE', '8'))
+XFADE_GROUP_TIMEOUT = 600
+
+# Default Lovable render mode: 'multi_step' (segments -> xfade -> merge -> subs)
+# or 'single_pass' (one ffmpeg graph, falls back to multi_step on failure).
+# A job can override it with "render_mode" in the /api/lovable-render payload.
+LOVABLE_RENDER_MODE = os.environ.get('YVE_RENDER_MODE', 'multi_step')
+RENDER_MODES = ('multi_step', 'single_pass')
+SINGLE_PASS_TIMEOUT = 1800
+
+# Rendered video delivery (/api/video, /output). Renders never change once
+# written, so browsers may cache them for RENDER_CACHE_MAX_AGE. YVE_MEDIA_OFFLOAD
+# takes Python out of the data path: 'x-accel' answers with X-Accel-Redirect to
+# YVE_ACCEL_PREFIX (an nginx `internal` location aliased to OUTPUT_DIR);
+# 'sendfile' sets X-Sendfile (Apache/lighttpd); 'none' streams from Flask.
+MEDIA_OFFLOAD = os.environ.get('YVE_MEDIA_OFFLOAD', 'none').strip().lower()
+MEDIA_ACCEL_PREFIX = os.environ.get('YVE_ACCEL_PREFIX', '/_yve_output/')
+RENDER_CACHE_MAX_AGE = 365 * 24 * 3600
+if MEDIA_OFFLOAD == 'sendfile':
+    app.config['USE_X_SENDFILE'] = True
+
+# Multipart uploads: file parts stream straight into UPLOAD_STAGING_DIR (same
+# filesystem as UPLOAD_DIR) while being hashed, then are renamed into place.
+# Request size caps per endpoint, in MB.
+UPLOAD_STAGING_DIR = UPLOAD_DIR / 'temp' / 'incoming'
+UPLOAD_STAGING_DIR.mkdir(parents=True, exist_ok=True)
+# Staged files are created 0600; they get the usual umask-based mode before
+# being moved into place (read once here: os.umask cannot be read thread-safely)
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+_MAX_AUDIO_UPLOAD = int(float(os.environ.get('YVE_MAX_AUDIO_UPLOAD_MB', '500')) * 1024 ** 2)
+UPLOAD_LIMITS = {
+    'upload_scene_media': int(float(os.environ.get('YVE_MAX_MEDIA_UPLOAD_MB', '2048')) * 1024 ** 2),
+    'upload_project_audio': _MAX_AUDIO_UPLOAD,
+    'create_project_from_audio': _MAX_AUDIO_UPLOAD,
+    'transcribe_and_analyze': _MAX_AUDIO_UPLOAD,
+    'start_render': int(float(os.environ.get('YVE_MAX_RENDER_UPLOAD_MB', '8192')) * 1024 ** 2),
+}
+
+# Content-addressed media store: one file per sha256 under BLOB_DIR (same
+# filesystem as uploads, so project and render copies are hard links).
+# Unreferenced blobs are deleted after BLOB_GC_GRACE seconds.
+BLOB_DIR = Path(os.environ.get('YVE_BLOB_DIR') or (UPLOAD_DIR / 'blobs'))
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
+BLOB_GC_INTERVAL = 600
+BLOB_GC_GRACE = int(float(os.environ.get('YVE_BLOB_GC_GRACE_HOURS', '1')) * 3600)
+
+# ffprobe runs for uploads and render sources happen on this many background
+# threads; results are cached per content hash in the state DB
+MEDIA_PROBE_WORKERS = int(os.environ.get('YVE_PROBE_WORKERS', '2'))
+MEDIA_PROBE_TIMEOUT = 60
+# Packets read (from the start) to estimate a video's keyframe interval
+MEDIA_PROBE_KEYFRAME_WINDOW = 60
+
+# Resumable (TUS) uploads to Supabase storage. Supabase requires 6 MB chunks.
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+UPLOAD_CHUNK_RETRIES = 5
 
 
 # Project-level audio helpers (project-scoped uploads)
@@ -85,10 +215,13 @@ def _load_project_file_and_data(project_key: str):
     return fp, data
 
 def _save_project_data(fp: Path, data: dict):
-    """Atomic write for project JSON."""
+    """Atomic write for project JSON (keeps the project index in sync)."""
+    # Listing summaries are precomputed here rather than on every list request
+    data['scene_count'], data['image_count'] = _project_scene_counts(data.get('scenes'))
     tmp = fp.with_suffix(fp.suffix + ".tmp")
     tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
     os.replace(tmp, fp)
+    _project_index_put(fp, data)
 
 
 
@@ -107,6 +240,10 @@ def _load_manifest(project_id, scene_number):
             return {}
     return {}
 
+# Held around read-modify-write of a scene manifest by the upload route and
+# the media inspection callback that fills in probe results
+_manifest_lock = threading.Lock()
+
 def _save_manifest(project_id, scene_number, data):
     sd = _scene_dir(project_id, scene_number)
     sd.mkdir(parents=True, exist_ok=True)
@@ -128,24 +265,951 @@ def _ffprobe_duration_seconds(path: Path):
         return None
 
 
-# Global state
-render_status = {
-    'active': False,
-    'progress': 0,
-    'current_task': '',
-    'scenes': [],
-    'complete': False,
-    'error': None,
-    'start_time': None
-}
+# =============================================================================
+# JOB STATE STORE
+# =============================================================================
+# Lovable render jobs, render_status ('render') and generation_status
+# ('generation') live in the jobs table of STATE_DB (SQLite, WAL). Every
+# update is written through; reads are served from _jobs_cache in O(1).
+
+_state_local = threading.local()
+_jobs_cache = {}
+_jobs_lock = threading.RLock()
+# Bumped per job on every write; _jobs_changed wakes progress-stream listeners
+_jobs_version = {}
+_jobs_changed = threading.Condition(_jobs_lock)
+_jobs_last_cleanup = 0.0
+# Newest jobs.updated_at already in the cache (see _jobs_sync)
+_jobs_synced_at = 0.0
+
+FINISHED_JOB_STATUSES = ('completed', 'failed')
+
+# Progress streams: minimum gap between events (bursts are collapsed into the
+# latest state) and keep-alive interval
+SSE_MIN_INTERVAL = 0.5
+SSE_HEARTBEAT = 15
+# Each open stream holds a server thread for its whole lifetime. Streams get
+# their own per-process budget on top of YVE_WEB_THREADS (gunicorn.conf.py sizes
+# the pool as both); past it, clients get a 503 and fall back to polling.
+SSE_MAX_STREAMS = int(os.environ.get('YVE_SSE_STREAMS', '48'))
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+
+def _state_db():
+    """Per-thread SQLite connection to the persistent state DB (autocommit, WAL)."""
+    conn = getattr(_state_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(str(STATE_DB), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " status TEXT,"
+            " updated_at REAL NOT NULL,"
+            " state TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS render_queue ("
+            " job_id TEXT PRIMARY KEY,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'queued',"
+            " payload TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS render_queue_order ON render_queue (state, priority DESC, enqueued_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha256 TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS blob_refs (ref TEXT PRIMARY KEY, sha256 TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS blob_refs_sha ON blob_refs (sha256)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            " url TEXT PRIMARY KEY,"
+            " sha256 TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " immutable INTEGER NOT NULL DEFAULT 0,"
+            " fetched_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS http_cache_lru ON http_cache (last_used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS media_info (sha256 TEXT PRIMARY KEY, probed_at REAL NOT NULL, info TEXT NOT NULL)")
+        _state_local.conn = conn
+    return conn
+
+
+def _job_persist(job_id, kind, state):
+    # Caller holds _jobs_lock, so writes for one job land in update order
+    _state_db().execute(
+        "INSERT OR REPLACE INTO jobs (job_id, kind, status, updated_at, state) VALUES (?, ?, ?, ?, ?)",
+        (job_id, kind, state.get('status'), time.time(), json.dumps(state, default=str)),
+    )
+    _jobs_version[job_id] = _jobs_version.get(job_id, 0) + 1
+    _jobs_changed.notify_all()
+
+
+def _job_create(job_id, fields, kind='lovable'):
+    """Create (or replace) a job's state."""
+    with _jobs_lock:
+        state = dict(fields)
+        _jobs_cache[job_id] = (kind, state)
+        _job_persist(job_id, kind, state)
+    _job_cleanup()
+
+
+def _job_update(job_id, **fields):
+    """Atomically merge fields into a job's state and write it through."""
+    with _jobs_lock:
+        kind, state = _jobs_cache.get(job_id) or ('lovable', {})
+        state = {**state, **fields}
+        _jobs_cache[job_id] = (kind, state)
+        _job_persist(job_id, kind, state)
+
+
+def _job_get(job_id):
+    """Current state of a job (a copy), or None. Never touches disk."""
+    entry = _jobs_cache.get(job_id)
+    return dict(entry[1]) if entry else None
+
+
+def _job_cleanup(force=False):
+    """Drop finished jobs older than JOB_STATE_TTL (at most every 10 minutes)."""
+    global _jobs_last_cleanup
+    now = time.time()
+    if not force and now - _jobs_last_cleanup < 600:
+        return
+    _jobs_last_cleanup = now
+    cutoff = now - JOB_STATE_TTL
+    with _jobs_lock:
+        rows = _state_db().execute(
+            "SELECT job_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (*FINISHED_JOB_STATUSES, cutoff),
+        ).fetchall()
+        for row in rows:
+            _jobs_cache.pop(row['job_id'], None)
+            _jobs_version.pop(row['job_id'], None)
+        _state_db().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (*FINISHED_JOB_STATUSES, cutoff),
+        )
+        if rows:
+            # Streams still open on a dropped job end with 'Job not found'
+            _jobs_changed.notify_all()
+
+
+def _claim_boot_recovery():
+    """True for exactly one process per server start (SERVER_BOOT_ID)."""
+    conn = _state_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'boot_id'").fetchone()
+        first = row is None or row['value'] != SERVER_BOOT_ID
+        if first:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('boot_id', ?)", (SERVER_BOOT_ID,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return first
+
+
+def _jobs_load():
+    """Fill the cache from STATE_DB; work that was in flight when the server died is marked interrupted."""
+    global _jobs_synced_at
+    with _jobs_lock:
+        for row in _state_db().execute("SELECT job_id, kind, updated_at, state FROM jobs"):
+            _jobs_cache[row['job_id']] = (row['kind'], json.loads(row['state']))
+            _jobs_synced_at = max(_jobs_synced_at, row['updated_at'])
+        if _claim_boot_recovery():
+            for job_id in ('render', 'generation'):
+                entry = _jobs_cache.get(job_id)
+                if entry and entry[1].get('active'):
+                    _job_update(job_id, active=False, error='Interrupted by server restart')
+    _job_cleanup(force=True)
+
+
+def _jobs_sync():
+    """
+    Pull job rows written by other worker processes into the cache.
+
+    Cheap when nothing changed (PRAGMA data_version). Rows from the last few
+    seconds are re-read because writers stamp updated_at before they commit.
+    """
+    global _jobs_synced_at
+    conn = _state_db()
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if data_version == getattr(_state_local, 'data_version', None):
+        return
+    _state_local.data_version = data_version
+    changed = False
+    with _jobs_lock:
+        rows = conn.execute(
+            "SELECT job_id, kind, updated_at, state FROM jobs WHERE updated_at >= ?", (_jobs_synced_at - 5,)
+        ).fetchall()
+        for row in rows:
+            _jobs_synced_at = max(_jobs_synced_at, row['updated_at'])
+            entry = _jobs_cache.get(row['job_id'])
+            if entry and json.dumps(entry[1], default=str) == row['state']:
+                continue
+            _jobs_cache[row['job_id']] = (row['kind'], json.loads(row['state']))
+            _jobs_version[row['job_id']] = _jobs_version.get(row['job_id'], 0) + 1
+            changed = True
+        if changed:
+            _jobs_changed.notify_all()
+
+
+def _jobs_sync_loop():
+    while True:
+        time.sleep(JOB_SYNC_INTERVAL)
+        try:
+            _jobs_sync()
+        except Exception as e:
+            logger.warning("Job state sync failed: %s", e)
+
+
+def _job_event_stream(job_id, until_finished=False, envelope=False):
+    """
+    Server-Sent Events generator for one job's state.
+
+    Emits the full state whenever it changes, at most once per SSE_MIN_INTERVAL
+    so rapid progress updates collapse into one event, plus keep-alive comments.
+    With envelope=True each event carries {'success': True, **state}, the same
+    body the matching polling endpoint returns.
+    """
+    yield "retry: 3000\n\n"
+    last_version = None
+    last_payload = None
+    last_sent = 0.0
+    while True:
+        with _jobs_changed:
+            changed = _jobs_changed.wait_for(
+                lambda: _jobs_version.get(job_id, 0) != last_version, timeout=SSE_HEARTBEAT
+            )
+        if not changed:
+            yield ": keep-alive\n\n"
+            continue
+
+        wait = SSE_MIN_INTERVAL - (time.time() - last_sent)
+        if wait > 0:
+            time.sleep(wait)
+
+        with _jobs_lock:
+            version = _jobs_version.get(job_id, 0)
+            state = _job_get(job_id)
+        if state is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+            return
+
+        payload = json.dumps({'success': True, **state} if envelope else state, default=str)
+        if payload == last_payload:
+            last_version = version
+            continue
+
+        last_version, last_payload, last_sent = version, payload, time.time()
+        yield f"data: {payload}\n\n"
+        if until_finished and state.get('status') in FINISHED_JOB_STATUSES:
+            yield "event: end\ndata: {}\n\n"
+            return
+
+
+def _event_stream_response(job_id, until_finished=False, envelope=False):
+    if not _sse_slots.acquire(blocking=False):
+        resp = jsonify({'success': False, 'error': 'Too many open progress streams, poll the status endpoint instead'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = str(SSE_HEARTBEAT)
+        resp.headers['Access-Control-Allow-Origin'] = '*'
+        return resp
+    resp = Response(
+        _job_event_stream(job_id, until_finished=until_finished, envelope=envelope),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # stop nginx from buffering the stream
+            'Access-Control-Allow-Origin': '*',
+        },
+    )
+    # The WSGI server closes the response however the stream ends
+    resp.call_on_close(_sse_slots.release)
+    return resp
+
+
+_jobs_load()
+threading.Thread(target=_jobs_sync_loop, name='job-sync', daemon=True).start()
+if _job_get('render') is None:
+    _job_create('render', {
+        'active': False,
+        'progress': 0,
+        'current_task': '',
+        'scenes': [],
+        'complete': False,
+        'error': None,
+        'start_time': None
+    }, kind='render')
+if _job_get('generation') is None:
+    _job_create('generation', {
+        'active': False,
+        'progress': 0,
+        'current_task': '',
+        'complete': False,
+        'error': None
+    }, kind='generation')
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+# Minimal Prometheus registry served as text at /metrics. Metrics are declared
+# once with _metric(); values are kept per label-value tuple.
+
+METRIC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)  # Mbps
+
+# Directory sizes are walked by a background thread every DISK_USAGE_TTL
+# seconds (started by the first /metrics scrape); scrapes report the last walk
+DISK_USAGE_TTL = 60
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+# Called at scrape time to refresh gauges that are read rather than counted
+_metric_collectors = []
+
+
+def _metric(name, kind, help_text, labels=(), buckets=METRIC_BUCKETS):
+    """Declare a counter, gauge or histogram."""
+    _metrics[name] = {
+        'kind': kind,
+        'help': help_text,
+        'labels': tuple(labels),
+        'buckets': tuple(buckets) if kind == 'histogram' else None,
+        'values': {},
+    }
+
+
+def _metric_key(metric, labels):
+    return tuple(str(labels.get(label, '')) for label in metric['labels'])
+
+
+def _metric_inc(name, amount=1, **labels):
+    metric = _metrics[name]
+    key = _metric_key(metric, labels)
+    with _metrics_lock:
+        metric['values'][key] = metric['values'].get(key, 0) + amount
+
+
+def _metric_set(name, value, **labels):
+    metric = _metrics[name]
+    with _metrics_lock:
+        metric['values'][_metric_key(metric, labels)] = value
+
+
+def _metric_observe(name, value, **labels):
+    metric = _metrics[name]
+    key = _metric_key(metric, labels)
+    with _metrics_lock:
+        state = metric['values'].get(key)
+        if state is None:
+            state = metric['values'][key] = {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(metric['buckets']):
+            if value <= bound:
+                state['buckets'][i] += 1
+        state['sum'] += value
+        state['count'] += 1
+
+
+def _metric_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    def esc(v):
+        return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in pairs) + '}'
+
+
+def _metrics_text():
+    """Every declared metric in the Prometheus text exposition format."""
+    for collect in _metric_collectors:
+        try:
+            collect()
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+    lines = []
+    with _metrics_lock:
+        for name, metric in _metrics.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, value in sorted(metric['values'].items()):
+                if metric['kind'] != 'histogram':
+                    lines.append(f"{name}{_metric_labels(metric['labels'], key)} {value}")
+                    continue
+                for bound, count in zip(metric['buckets'], value['buckets']):
+                    lines.append(f"{name}_bucket{_metric_labels(metric['labels'], key, ('le', bound))} {count}")
+                lines.append(f"{name}_bucket{_metric_labels(metric['labels'], key, ('le', '+Inf'))} {value['count']}")
+                lines.append(f"{name}_sum{_metric_labels(metric['labels'], key)} {value['sum']}")
+                lines.append(f"{name}_count{_metric_labels(metric['labels'], key)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+_metric('yve_render_stage_seconds', 'histogram',
+        'Wall time of each Lovable render stage.', labels=('stage',))
+_metric('yve_segment_encode_seconds', 'histogram',
+        'Time to produce one render segment, by where it came from (encoded, cache, reused).',
+        labels=('source',))
+_metric('yve_segment_bytes_total', 'counter',
+        'Segment encode input (source media) and output bytes.', labels=('direction',))
+_metric('yve_segment_cache_requests_total', 'counter',
+        'Segment lookups by result: hit, miss, or reused from the last render.', labels=('result',))
+_metric('yve_segment_cache_bytes', 'gauge', 'Size of the segment cache.')
+_metric('yve_http_request_duration_seconds', 'histogram',
+        'HTTP request latency by route.', labels=('method', 'route', 'status'), buckets=REQUEST_BUCKETS)
+_metric('yve_render_jobs', 'gauge', 'Lovable render jobs in the queue by state (queued, running).',
+        labels=('state',))
+_metric('yve_ffmpeg_processes_total', 'counter', 'Finished ffmpeg subprocesses by result.', labels=('result',))
+_metric('yve_ffmpeg_running', 'gauge', 'ffmpeg subprocesses currently running.')
+_metric('yve_transfer_bytes_total', 'counter', 'Bytes downloaded (scene media) and uploaded (renders).',
+        labels=('direction',))
+_metric('yve_transfer_throughput_mbps', 'histogram', 'Throughput of each download and upload.',
+        labels=('direction',), buckets=THROUGHPUT_BUCKETS)
+_metric('yve_dir_bytes', 'gauge', 'Bytes used under each data directory.', labels=('dir',))
+_metric('yve_disk_free_bytes', 'gauge', 'Free space on the filesystem holding each data directory.',
+        labels=('dir',))
+_metric('yve_blob_store_blobs', 'gauge', 'Referenced blobs in the media store.')
+_metric('yve_blob_store_bytes', 'gauge', 'Bytes of referenced blobs in the media store.')
+_metric('yve_blob_store_refs', 'gauge', 'References held on blobs (scene media, project audio, renders).')
+_metric('yve_http_cache_requests_total', 'counter',
+        'Media downloads by cache result: hit (immutable), revalidated (304), miss, uncacheable.',
+        labels=('result',))
+_metric('yve_http_cache_bytes', 'gauge', 'Bytes of downloaded media held by the HTTP cache.')
+_metric('yve_media_probes_total', 'counter', 'Media inspections by result: cached, probed, failed.',
+        labels=('result',))
+_metric('yve_media_probe_seconds', 'histogram', 'ffprobe time per media inspection.')
+
+_ffmpeg_running = 0
+_disk_usage_thread = None
+
+
+def _record_transfer(direction, nbytes, seconds):
+    _metric_inc('yve_transfer_bytes_total', nbytes, direction=direction)
+    if nbytes and seconds > 0:
+        _metric_observe('yve_transfer_throughput_mbps', nbytes * 8 / seconds / 1e6, direction=direction)
+
+
+def _dir_bytes(path):
+    # Hard links (blob store copies) are counted once
+    total = 0
+    seen = set()
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if st.st_nlink > 1:
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
+
+
+def _disk_usage_loop():
+    while True:
+        for label, path in (('uploads', UPLOAD_DIR), ('lovable_temp', LOVABLE_TEMP_DIR), ('output', OUTPUT_DIR),
+                            ('blobs', BLOB_DIR)):
+            try:
+                _metric_set('yve_dir_bytes', _dir_bytes(path), dir=label)
+                _metric_set('yve_disk_free_bytes', shutil.disk_usage(path).free, dir=label)
+            except Exception as e:
+                logger.warning("Disk usage walk of %s failed: %s", path, e)
+        time.sleep(DISK_USAGE_TTL)
+
+
+def _collect_disk_usage():
+    global _disk_usage_thread
+    with _metrics_lock:
+        if _disk_usage_thread is not None:
+            return
+        _disk_usage_thread = threading.Thread(target=_disk_usage_loop, name='disk-usage', daemon=True)
+    _disk_usage_thread.start()
+
+
+def _collect_render_jobs():
+    counts = {'queued': 0, 'running': 0}
+    for row in _state_db().execute("SELECT state, COUNT(*) FROM render_queue GROUP BY state"):
+        counts[row[0]] = row[1]
+    for state, n in counts.items():
+        _metric_set('yve_render_jobs', n, state=state)
+
+
+def _collect_blob_store():
+    row = _state_db().execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+        " WHERE EXISTS (SELECT 1 FROM blob_refs r WHERE r.sha256 = blobs.sha256)"
+    ).fetchone()
+    _metric_set('yve_blob_store_blobs', row[0])
+    _metric_set('yve_blob_store_bytes', row[1])
+    refs = _state_db().execute("SELECT COUNT(*) FROM blob_refs").fetchone()[0]
+    _metric_set('yve_blob_store_refs', refs)
+    _metric_set('yve_http_cache_bytes',
+                _state_db().execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0])
+
+
+def _collect_process_gauges():
+    _metric_set('yve_ffmpeg_running', _ffmpeg_running)
+    if _segment_cache_bytes is not None:
+        _metric_set('yve_segment_cache_bytes', _segment_cache_bytes)
+
+
+_metric_collectors.extend([_collect_disk_usage, _collect_render_jobs, _collect_blob_store, _collect_process_gauges])
+
+
+@app.before_request
+def _metrics_request_started():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _metrics_request_finished(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        _metric_observe('yve_http_request_duration_seconds', time.perf_counter() - started,
+                        method=request.method, route=route, status=response.status_code)
+    return response
+
+
+@contextmanager
+def _job_stage(job_id, timings, stage):
+    """Time a render stage: accumulates into timings, stores them on the job and in metrics."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(timings.get(stage, 0.0) + elapsed, 3)
+        _job_update(job_id, timings=dict(timings))
+        _metric_observe('yve_render_stage_seconds', elapsed, stage=stage)
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(_metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# =============================================================================
+# STREAMING UPLOADS
+# =============================================================================
+
+class _StagedUpload:
+    """
+    Writable/readable file for one multipart file part, hashed as it is written.
+
+    Lives in UPLOAD_STAGING_DIR until _save_upload() renames it into place;
+    closing it without that (e.g. the view never saved it) deletes it.
+    """
+
+    def __init__(self):
+        fd, path = tempfile.mkstemp(dir=UPLOAD_STAGING_DIR, suffix='.part')
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        self.path = Path(path)
+        self.file = os.fdopen(fd, 'w+b')
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.moved = False
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        if not self.moved:
+            self.path.unlink(missing_ok=True)
+
+    def __getattr__(self, name):
+        # read/readline/seek/tell/flush for Werkzeug and FileStorage.save()
+        return getattr(self.file, name)
+
+
+class StreamingUploadRequest(Request):
+    """Request that stages file parts through _StagedUpload, with UPLOAD_LIMITS per endpoint."""
+
+    @property
+    def max_content_length(self):
+        endpoint = self.url_rule.endpoint if self.url_rule else None
+        return UPLOAD_LIMITS.get(endpoint, app.config.get('MAX_CONTENT_LENGTH'))
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return _StagedUpload()
+
+
+app.request_class = StreamingUploadRequest
+
+
+@app.before_request
+def _reject_oversized_upload():
+    limit = request.max_content_length
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        return jsonify({'success': False, 'error': f"Upload too large (limit {limit // 1024 ** 2} MB)"}), 413
+
+
+def _save_upload(storage, dest: Path, ref=None):
+    """
+    Put an uploaded file at dest atomically. Returns (sha256 hex, size).
+
+    A staged upload is renamed (no copy); anything else is copied through a
+    temp file next to dest while hashing. With ref, the file goes into the
+    blob store under that reference and dest becomes a link to the blob.
+    """
+    dest = Path(dest)
+    stream = storage.stream
+    if isinstance(stream, _StagedUpload):
+        stream.file.flush()
+        if ref:
+            sha256 = stream.hash.hexdigest()
+            _blob_put(stream.path, sha256, ref, dest)
+            stream.moved = True
+            stream.close()
+            return sha256, stream.size
+        try:
+            os.replace(stream.path, dest)
+        except OSError:
+            # Different filesystem: copy next to dest, then rename
+            tmp = dest.with_name(dest.name + '.uploading')
+            shutil.copyfile(stream.path, tmp)
+            os.replace(tmp, dest)
+        stream.moved = True
+        stream.close()
+        return stream.hash.hexdigest(), stream.size
+
+    h = hashlib.sha256()
+    size = 0
+    tmp = dest.with_name(dest.name + '.uploading')
+    with open(tmp, 'wb') as f:
+        for chunk in iter(lambda: stream.read(DOWNLOAD_CHUNK_SIZE), b''):
+            h.update(chunk)
+            size += len(chunk)
+            f.write(chunk)
+    if ref:
+        _blob_put(tmp, h.hexdigest(), ref, dest)
+    else:
+        os.replace(tmp, dest)
+    return h.hexdigest(), size
+
+
+# =============================================================================
+# BLOB STORE
+# =============================================================================
+# Uploaded and downloaded media is stored once per content hash at
+# BLOB_DIR/<sha[:2]>/<sha>. Project, scene and render paths are hard links to
+# the blob. blob_refs maps an owner reference (e.g. "scene-media:<project>/
+# <scene>/image", "render:<job>/<file>") to the blob it holds; a blob's
+# refcount is its number of rows there.
+# Adding and collecting blobs both run inside a write transaction, so one
+# process cannot delete a blob that another is adding a reference to.
+
+_blob_last_gc = 0.0
+_blob_gc_lock = threading.Lock()
+# Held while a collection runs, so collections never overlap
+_blob_gc_running = threading.Lock()
+
+
+def _blob_path(sha256):
+    return BLOB_DIR / sha256[:2] / sha256
+
+
+def _blob_put(src, sha256, ref, dest=None):
+    """
+    Move src (a file whose hash is sha256) into the store and point ref at it.
+
+    If the blob already exists src is discarded. The blob is then linked to
+    dest when given. Returns the blob path. A src on another filesystem than
+    BLOB_DIR is copied next to the blob first (outside the transaction).
+    """
+    blob = _blob_path(sha256)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    if os.stat(src).st_dev != os.stat(blob.parent).st_dev:
+        tmp = blob.with_name(f"{blob.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(src, tmp)
+        os.unlink(src)
+        src = tmp
+    now = time.time()
+    conn = _state_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO blobs (sha256, size, created_at, last_used) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(sha256) DO UPDATE SET last_used = excluded.last_used",
+            (sha256, os.path.getsize(src), now, now),
+        )
+        conn.execute("INSERT OR REPLACE INTO blob_refs (ref, sha256) VALUES (?, ?)", (ref, sha256))
+        if blob.exists():
+            os.unlink(src)
+        else:
+            os.replace(src, blob)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if dest is not None:
+        _link_or_copy(blob, dest)
+    return blob
+
+
+def _blob_link(sha256, ref=None, dest=None):
+    """Add ref to an existing blob and link it to dest. False if the blob is gone."""
+    blob = _blob_path(sha256)
+    conn = _state_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        updated = conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256)).rowcount
+        if not updated or not blob.exists():
+            conn.execute("ROLLBACK")
+            return False
+        if ref:
+            conn.execute("INSERT OR REPLACE INTO blob_refs (ref, sha256) VALUES (?, ?)", (ref, sha256))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if dest is not None:
+        _link_or_copy(blob, dest)
+    return True
+
+
+def _blob_release(ref, prefix=False):
+    """Drop a reference (or, with prefix, every reference starting with ref)."""
+    if prefix:
+        _state_db().execute("DELETE FROM blob_refs WHERE substr(ref, 1, ?) = ?", (len(ref), ref))
+    else:
+        _state_db().execute("DELETE FROM blob_refs WHERE ref = ?", (ref,))
+
+
+def _blob_gc():
+    """
+    Delete blobs unreferenced for BLOB_GC_GRACE seconds, then stray files in
+    BLOB_DIR that have no row. Returns the bytes reclaimed.
+
+    Only the collected rows and their files are handled inside the write
+    transaction; the directory sweep runs after it is committed.
+    """
+    cutoff = time.time() - BLOB_GC_GRACE
+    reclaimed = 0
+    conn = _state_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT sha256, size FROM blobs WHERE last_used < ?"
+            " AND NOT EXISTS (SELECT 1 FROM blob_refs r WHERE r.sha256 = blobs.sha256)",
+            (cutoff,),
+        ).fetchall()
+        for row in rows:
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (row['sha256'],))
+            conn.execute("DELETE FROM media_info WHERE sha256 = ?", (row['sha256'],))
+            try:
+                _blob_path(row['sha256']).unlink()
+                reclaimed += row['size']
+            except FileNotFoundError:
+                pass
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    for p in BLOB_DIR.glob('*/*'):
+        try:
+            st = p.stat()
+            if st.st_mtime >= cutoff:
+                continue
+            # Re-checked per file: the blob may have been added since the sweep started
+            if conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (p.name,)).fetchone():
+                continue
+            p.unlink()
+            reclaimed += st.st_size
+        except FileNotFoundError:
+            pass
+    if reclaimed:
+        logger.info("Blob store GC reclaimed %d bytes (%d blobs)", reclaimed, len(rows))
+    return reclaimed
+
+
+def _blob_gc_soon():
+    """Run _blob_gc on a background thread, at most every BLOB_GC_INTERVAL."""
+    global _blob_last_gc
+    with _blob_gc_lock:
+        now = time.time()
+        if now - _blob_last_gc < BLOB_GC_INTERVAL:
+            return
+        _blob_last_gc = now
+
+    def run():
+        if not _blob_gc_running.acquire(blocking=False):
+            return
+        try:
+            _blob_gc()
+        except Exception as e:
+            logger.warning("Blob store GC failed: %s", e)
+        finally:
+            _blob_gc_running.release()
+
+    threading.Thread(target=run, name='yve-blob-gc', daemon=True).start()
+
+
+# =============================================================================
+# MEDIA INSPECTION
+# =============================================================================
+# ffprobe results (duration, frame size, codec, fps, keyframe interval, audio
+# presence) for media in the blob store, cached in the media_info table by
+# sha256. Probes run on a small pool so upload requests never wait on them;
+# concurrent requests for the same content share one probe.
+
+_probe_pool = None
+_probe_inflight = {}
+_probe_lock = threading.Lock()
+
+# Video codecs ffprobe reports for still images
+IMAGE_CODECS = {'png', 'mjpeg', 'webp', 'bmp', 'gif', 'tiff', 'jpegls', 'jpeg2000'}
+
+
+def _parse_rate(rate):
+    """ffprobe frame rate such as '30000/1001' -> float (None if unknown)."""
+    try:
+        num, _, den = str(rate).partition('/')
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value > 0 else None
+
+
+def _ffprobe_keyframe_interval(path):
+    """Median seconds between video keyframes in the first MEDIA_PROBE_KEYFRAME_WINDOW seconds."""
+    res = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+         '-read_intervals', f"%+{MEDIA_PROBE_KEYFRAME_WINDOW}", '-of', 'csv=p=0', str(path)],
+        capture_output=True, text=True, timeout=MEDIA_PROBE_TIMEOUT, check=False,
+    )
+    times = []
+    for line in res.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if flags.startswith('K'):
+            try:
+                times.append(float(pts))
+            except ValueError:
+                pass
+    times.sort()
+    gaps = sorted(b - a for a, b in zip(times, times[1:]) if b > a)
+    if not gaps:
+        return None
+    return round(gaps[len(gaps) // 2], 3)
+
+
+def _ffprobe_media(path):
+    """Inspect a media file with ffprobe. Returns an info dict, or None if it could not be probed."""
+    try:
+        res = subprocess.run(
+            ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', str(path)],
+            capture_output=True, text=True, timeout=MEDIA_PROBE_TIMEOUT, check=False,
+        )
+        data = json.loads(res.stdout or '{}')
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    streams = data.get('streams') or []
+    if not streams:
+        return None
+    fmt = data.get('format') or {}
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+    try:
+        duration = float(fmt.get('duration'))
+    except (TypeError, ValueError):
+        duration = None
+    info = {
+        'format': fmt.get('format_name'),
+        'duration': duration,
+        'has_video': video is not None,
+        'has_audio': audio is not None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+    }
+    if video:
+        is_image = video.get('codec_name') in IMAGE_CODECS and not (duration and duration > 0.1)
+        info.update({
+            'is_image': is_image,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'video_codec': video.get('codec_name'),
+            'pix_fmt': video.get('pix_fmt'),
+            'sample_aspect_ratio': video.get('sample_aspect_ratio'),
+            'fps': None if is_image else _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate')),
+            'keyframe_interval': None,
+        })
+        if not is_image:
+            try:
+                info['keyframe_interval'] = _ffprobe_keyframe_interval(path)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+    return info
+
+
+def _media_info(sha256):
+    """Cached inspection result for content sha256, or None."""
+    row = _state_db().execute("SELECT info FROM media_info WHERE sha256 = ?", (sha256,)).fetchone()
+    return json.loads(row['info']) if row else None
+
+
+def _probe_and_cache(path, sha256):
+    started = time.perf_counter()
+    info = _ffprobe_media(path)
+    _metric_observe('yve_media_probe_seconds', time.perf_counter() - started)
+    if info is None:
+        _metric_inc('yve_media_probes_total', result='failed')
+        return None
+    _metric_inc('yve_media_probes_total', result='probed')
+    _state_db().execute(
+        "INSERT OR REPLACE INTO media_info (sha256, probed_at, info) VALUES (?, ?, ?)",
+        (sha256, time.time(), json.dumps(info)),
+    )
+    return info
+
+
+def _inspect_media(path, sha256, callback=None):
+    """
+    Start inspecting path (whose content hash is sha256) in the background.
+
+    Returns a Future resolving to the info dict (None if ffprobe failed).
+    callback(info) runs when it resolves - immediately, in this thread, if
+    the result is already cached.
+    """
+    global _probe_pool
+    info = _media_info(sha256)
+    with _probe_lock:
+        if info is not None:
+            _metric_inc('yve_media_probes_total', result='cached')
+            future = Future()
+            future.set_result(info)
+        else:
+            future = _probe_inflight.get(sha256)
+            if future is None:
+                if _probe_pool is None:
+                    _probe_pool = ThreadPoolExecutor(max_workers=max(1, MEDIA_PROBE_WORKERS),
+                                                     thread_name_prefix='yve-probe')
+                future = _probe_pool.submit(_probe_and_cache, str(path), sha256)
+                _probe_inflight[sha256] = future
+                future.add_done_callback(lambda _f: _probe_inflight.pop(sha256, None))
+    if callback:
+        future.add_done_callback(lambda f: callback(f.result() if not f.exception() else None))
+    return future
 
-generation_status = {
-    'active': False,
-    'progress': 0,
-    'current_task': '',
-    'complete': False,
-    'error': None
-}
 
 def load_config():
     if CONFIG_FILE.exists():
@@ -237,8 +1301,6 @@ def serve_assets(filename):
 @app.route('/api/transcribe-and-analyze', methods=['POST'])
 def transcribe_and_analyze():
     """Step 1: Upload audio, transcribe, and generate scene breakdown"""
-    global generation_status
-    
     try:
         audio_file = request.files.get('audio')
         if not audio_file:
@@ -246,19 +1308,18 @@ def transcribe_and_analyze():
         
         # Save audio
         audio_path = UPLOAD_DIR / 'audio' / audio_file.filename
-        audio_file.save(audio_path)
+        _save_upload(audio_file, audio_path)
         
-        generation_status = {
+        _job_create('generation', {
             'active': True,
             'progress': 10,
             'current_task': 'Transcribing audio...',
             'complete': False,
             'error': None
-        }
+        }, kind='generation')
         
         # Run transcription and analysis in background
         def process():
-            global generation_status
             try:
                 import sys
                 sys.path.insert(0, str(BASE_DIR))
@@ -267,27 +1328,24 @@ def transcribe_and_analyze():
                 generator = AssetGenerator(str(audio_path), str(UPLOAD_DIR / 'temp'))
                 
                 def progress_callback(msg):
-                    generation_status['current_task'] = msg
+                    _job_update('generation', current_task=msg)
                     if 'Transcribing' in msg:
-                        generation_status['progress'] = 30
+                        _job_update('generation', progress=30)
                     elif 'Analyzing' in msg:
-                        generation_status['progress'] = 60
+                        _job_update('generation', progress=60)
                 
                 result = generator.run_full_pipeline(progress_callback)
                 
-                generation_status['progress'] = 100
-                generation_status['complete'] = True
-                generation_status['scenes'] = result['scenes']
-                generation_status['transcript'] = result['transcript']['text']
+                _job_update('generation', progress=100, complete=True,
+                            scenes=result['scenes'], transcript=result['transcript']['text'])
                 
             except Exception as e:
                 import traceback
-                generation_status['error'] = str(e)
-                generation_status['trace'] = traceback.format_exc()
+                _job_update('generation', error=str(e), trace=traceback.format_exc())
                 print(f"Error: {e}")
                 print(traceback.format_exc())
             finally:
-                generation_status['active'] = False
+                _job_update('generation', active=False)
         
         threading.Thread(target=process).start()
         
@@ -321,8 +1379,7 @@ def save_project_json():
             'transcript': ' '.join([s.get('narration_text', '') for s in scenes])
         }
         
-        with open(project_file, 'w') as f:
-            json.dump(project_data, f, indent=2)
+        _save_project_data(project_file, project_data)
         
         return jsonify({
             'success': True,
@@ -337,8 +1394,6 @@ def save_project_json():
 @app.route('/api/analyze-transcript', methods=['POST'])
 def analyze_transcript():
     """Analyze pasted transcript without audio upload"""
-    global generation_status
-    
     try:
         data = request.json
         transcript = data.get('transcript', '')
@@ -346,22 +1401,20 @@ def analyze_transcript():
         if not transcript or len(transcript) < 100:
             return jsonify({'success': False, 'error': 'Transcript too short'})
         
-        generation_status = {
+        _job_create('generation', {
             'active': True,
             'progress': 30,
             'current_task': 'Analyzing transcript with Claude...',
             'complete': False,
             'error': None
-        }
+        }, kind='generation')
         
         # Run analysis in background
         def process():
-            global generation_status
             try:
                 import anthropic
                 
-                generation_status['progress'] = 60
-                generation_status['current_task'] = 'Generating scene breakdown...'
+                _job_update('generation', progress=60, current_task='Generating scene breakdown...')
                 
                 client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
                 
@@ -401,19 +1454,15 @@ Return ONLY a JSON array of scenes, no other text."""
                 with open(scenes_file, 'w') as f:
                     json.dump(scenes, f, indent=2)
                 
-                generation_status['progress'] = 100
-                generation_status['complete'] = True
-                generation_status['scenes'] = scenes
-                generation_status['transcript'] = transcript
+                _job_update('generation', progress=100, complete=True, scenes=scenes, transcript=transcript)
                 
             except Exception as e:
                 import traceback
-                generation_status['error'] = str(e)
-                generation_status['trace'] = traceback.format_exc()
+                _job_update('generation', error=str(e), trace=traceback.format_exc())
                 print(f"Error: {e}")
                 print(traceback.format_exc())
             finally:
-                generation_status['active'] = False
+                _job_update('generation', active=False)
         
         threading.Thread(target=process).start()
         
@@ -426,26 +1475,28 @@ Return ONLY a JSON array of scenes, no other text."""
 @app.route('/api/generation-status')
 def get_generation_status():
     """Get status of transcription/scene analysis"""
-    return jsonify(generation_status)
+    return jsonify(_job_get('generation'))
+
+@app.route('/api/generation-status/events')
+def stream_generation_status():
+    """Push generation status changes as Server-Sent Events."""
+    return _event_stream_response('generation')
 
 @app.route('/api/generate-assets', methods=['POST'])
 def generate_assets():
     """Step 2: Generate images/videos from approved scenes"""
-    global generation_status
-    
     try:
         scenes = request.json.get('scenes', [])
         
-        generation_status = {
+        _job_create('generation', {
             'active': True,
             'progress': 0,
             'current_task': 'Starting asset generation...',
             'complete': False,
             'error': None
-        }
+        }, kind='generation')
         
         def process():
-            global generation_status
             try:
                 import sys
                 sys.path.insert(0, str(BASE_DIR))
@@ -454,13 +1505,11 @@ def generate_assets():
                 generator = AssetGenerator(None, str(UPLOAD_DIR / 'media'))
                 
                 def progress_callback(msg):
-                    generation_status['current_task'] = msg
+                    _job_update('generation', current_task=msg)
                 
                 results = generator.generate_all_assets(scenes, progress_callback)
                 
-                generation_status['progress'] = 100
-                generation_status['complete'] = True
-                generation_status['assets'] = results
+                _job_update('generation', progress=100, complete=True, assets=results)
                 
                 # Save project
                 try:
@@ -496,8 +1545,7 @@ def generate_assets():
                     }
                     
                     project_id = f"{int(time.time())}_{audio_name.replace(' ', '_')}"
-                    with open(projects_dir / f'{project_id}.json', 'w') as f:
-                        json.dump(project_data, f, indent=2)
+                    _save_project_data(projects_dir / f'{project_id}.json', project_data)
                     
                     print(f"Project saved: {project_id}")
                 except Exception as e:
@@ -505,12 +1553,11 @@ def generate_assets():
                 
             except Exception as e:
                 import traceback
-                generation_status['error'] = str(e)
-                generation_status['trace'] = traceback.format_exc()
+                _job_update('generation', error=str(e), trace=traceback.format_exc())
                 print(f"Error: {e}")
                 print(traceback.format_exc())
             finally:
-                generation_status['active'] = False
+                _job_update('generation', active=False)
         
         threading.Thread(target=process).start()
         
@@ -581,8 +1628,6 @@ def generate_work_order():
 
 @app.route('/api/start-render', methods=['POST'])
 def start_render():
-    global render_status
-    
     try:
         audio_files = request.files.getlist('audio')
         media_files = request.files.getlist('media')
@@ -597,9 +1642,9 @@ def start_render():
         
         # Save uploads
         for audio in audio_files:
-            audio.save(UPLOAD_DIR / 'audio' / audio.filename)
+            _save_upload(audio, UPLOAD_DIR / 'audio' / audio.filename)
         for media in media_files:
-            media.save(UPLOAD_DIR / 'media' / media.filename)
+            _save_upload(media, UPLOAD_DIR / 'media' / media.filename)
         
         # Save JSON - wrap in proper structure for engine
         if story_json:
@@ -632,7 +1677,7 @@ def start_render():
         with open(settings_path, 'w') as f:
             json.dump({'video_audio_volume': video_audio_volume}, f)
         
-        render_status = {
+        _job_create('render', {
             'active': True,
             'progress': 0,
             'current_task': 'Starting...',
@@ -640,7 +1685,7 @@ def start_render():
             'complete': False,
             'error': None,
             'start_time': datetime.now()
-        }
+        }, kind='render')
         
         threading.Thread(target=run_render).start()
         
@@ -649,8 +1694,6 @@ def start_render():
         return jsonify({'success': False, 'error': str(e)})
 
 def run_render():
-    global render_status
-    
     try:
         cmd = [
             'python3',
@@ -672,16 +1715,15 @@ def run_render():
                         idx = parts.index('of')
                         current = int(parts[idx-1])
                         total = int(parts[idx+1])
-                        render_status['progress'] = (current / total) * 100
-                        render_status['current_task'] = f"Scene {current}/{total}"
+                        _job_update('render', progress=(current / total) * 100,
+                                    current_task=f"Scene {current}/{total}")
                 except:
                     pass
         
         process.wait()
         
         if process.returncode == 0:
-            render_status['complete'] = True
-            render_status['progress'] = 100
+            _job_update('render', complete=True, progress=100)
             
             config = load_config()
             video_files = list(OUTPUT_DIR.glob('*.mp4'))
@@ -689,7 +1731,7 @@ def run_render():
             if video_files and config.get('notify_complete'):
                 video = video_files[0]
                 size_mb = video.stat().st_size / (1024 * 1024)
-                elapsed = datetime.now() - render_status['start_time']
+                elapsed = datetime.now() - _job_get('render')['start_time']
                 time_str = f"{int(elapsed.total_seconds()//60)}m"
                 
                 send_email(config['email'], f"✅ {video.stem} Complete!", 
@@ -697,18 +1739,23 @@ def run_render():
                 send_sms(config['phone'], f"✅ Video done! {video.stem[:30]}")
         else:
             error = process.stderr.read()
-            render_status['error'] = error
+            _job_update('render', error=error)
             config = load_config()
             if config.get('notify_error'):
                 send_email(config['email'], "⚠️ Render Error", error)
     except Exception as e:
-        render_status['error'] = str(e)
+        _job_update('render', error=str(e))
     finally:
-        render_status['active'] = False
+        _job_update('render', active=False)
 
 @app.route('/api/progress')
 def get_progress():
-    return jsonify(render_status)
+    return jsonify(_job_get('render'))
+
+@app.route('/api/progress/events')
+def stream_progress():
+    """Push render_status changes as Server-Sent Events (polling /api/progress still works)."""
+    return _event_stream_response('render')
 
 @app.route('/api/settings', methods=['POST'])
 def save_settings_route():
@@ -728,17 +1775,56 @@ def test_notification():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def _render_etag(render_id, path: Path):
+    """Strong ETag for a render: its id, plus size/mtime in case the file is ever replaced."""
+    st = path.stat()
+    return f"{render_id}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def _send_output_file(path: Path, mimetype=None, etag=True, immutable=False):
+    """
+    Send a file under OUTPUT_DIR with Range and conditional-GET support.
+
+    Range, If-Range, If-None-Match and If-Modified-Since are answered by
+    send_file; with MEDIA_OFFLOAD set the body is left to the front server.
+    """
+    if MEDIA_OFFLOAD == 'x-accel':
+        rel = path.resolve().relative_to(OUTPUT_DIR.resolve()).as_posix()
+        resp = Response(mimetype=mimetype or 'application/octet-stream')
+        resp.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(rel)
+        if isinstance(etag, str):
+            resp.set_etag(etag)
+    else:
+        resp = send_file(str(path), mimetype=mimetype, conditional=True, etag=etag)
+    if immutable:
+        resp.headers['Cache-Control'] = f"public, max-age={RENDER_CACHE_MAX_AGE}, immutable"
+    else:
+        # Revalidate every time; unchanged files cost a 304
+        resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
 @app.route('/output/<path:filename>')
 def download_file(filename):
-    return send_from_directory(OUTPUT_DIR, filename)
+    target = safe_join(str(OUTPUT_DIR), filename)
+    if target is None or not Path(target).is_file():
+        return jsonify({'error': 'File not found'}), 404
+    path = Path(target)
+    # <project_id>/<render_id>.mp4 is a finished render backup
+    parts = Path(filename).parts
+    if len(parts) == 2 and path.suffix == '.mp4':
+        return _send_output_file(path, mimetype='video/mp4', etag=_render_etag(path.stem, path), immutable=True)
+    return _send_output_file(path)
 
 
 @app.route('/api/video/<project_id>/<render_id>', methods=['GET'])
 def serve_video(project_id, render_id):
     """Serve rendered videos from the VPS output directory."""
-    video_path = OUTPUT_DIR / str(project_id) / f"{render_id}.mp4"
-    if video_path.exists():
-        return send_file(str(video_path), mimetype='video/mp4')
+    target = safe_join(str(OUTPUT_DIR), str(project_id), f"{render_id}.mp4")
+    if target and Path(target).is_file():
+        video_path = Path(target)
+        return _send_output_file(video_path, mimetype='video/mp4',
+                                 etag=_render_etag(render_id, video_path), immutable=True)
     return jsonify({'error': 'Video not found'}), 404
 
 
@@ -766,29 +1852,50 @@ def upload_scene_media(project_id, scene_number):
 
         filename = media.filename
         save_path = scene_dir / filename
-        media.save(save_path)
-
-        manifest = _load_manifest(project_id, scene_number)
-        manifest.setdefault('scene_number', str(scene_number))
-        manifest.setdefault('project_id', str(project_id))
-        manifest.setdefault('updated_at', datetime.utcnow().isoformat() + 'Z')
-
-        entry = {'filename': filename, 'url': f"/media/{project_id}/scene_{scene_number}/{filename}"}
-
-        if kind == 'video':
-            dur = _ffprobe_duration_seconds(save_path)
-            if dur is not None:
-                entry['duration_seconds'] = dur
-
-        manifest[kind] = entry
-        _save_manifest(project_id, scene_number, manifest)
+        sha256, size = _save_upload(media, save_path, ref=f"scene-media:{project_id}/{scene_number}/{kind}")
+
+        entry = {'filename': filename, 'url': f"/media/{project_id}/scene_{scene_number}/{filename}",
+                 'sha256': sha256, 'size': size}
+        info = _media_info(sha256)
+        if info is not None:
+            _apply_media_info(entry, kind, info)
+
+        with _manifest_lock:
+            manifest = _load_manifest(project_id, scene_number)
+            manifest.setdefault('scene_number', str(scene_number))
+            manifest.setdefault('project_id', str(project_id))
+            manifest.setdefault('updated_at', datetime.utcnow().isoformat() + 'Z')
+            manifest[kind] = entry
+            _save_manifest(project_id, scene_number, manifest)
 
-        return jsonify({'success': True, 'kind': kind, 'filename': filename, 'media_url': entry['url'], 'duration_seconds': entry.get('duration_seconds')})
+        if info is None:
+            # Probed in the background; the result lands in the manifest (see GET .../media)
+            def record(probed):
+                if probed is None:
+                    return
+                with _manifest_lock:
+                    current = _load_manifest(project_id, scene_number)
+                    if (current.get(kind) or {}).get('sha256') != sha256:
+                        return
+                    _apply_media_info(current[kind], kind, probed)
+                    _save_manifest(project_id, scene_number, current)
+            _inspect_media(_blob_path(sha256), sha256, callback=record)
+
+        return jsonify({'success': True, 'kind': kind, 'filename': filename, 'media_url': entry['url'],
+                        'duration_seconds': entry.get('duration_seconds'), 'sha256': sha256,
+                        'media_info': entry.get('media_info'), 'inspection': 'done' if info is not None else 'pending'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 
+def _apply_media_info(entry, kind, info):
+    """Copy an inspection result onto a scene manifest entry."""
+    entry['media_info'] = info
+    if kind == 'video' and info.get('duration') is not None:
+        entry['duration_seconds'] = info['duration']
+
+
 @app.route('/api/project/<project_id>/scene/<scene_number>/media', methods=['GET'])
 def get_scene_media(project_id, scene_number):
     try:
@@ -816,6 +1923,8 @@ def delete_scene_media(project_id, scene_number):
                     fp.unlink()
             except Exception:
                 pass
+        _blob_release(f"scene-media:{project_id}/{scene_number}/{kind}")
+        _blob_gc_soon()
 
         if kind in manifest:
             manifest.pop(kind, None)
@@ -857,7 +1966,7 @@ def create_project_from_audio():
         audio_dir.mkdir(parents=True, exist_ok=True)
         audio_fn = secure_filename(audio_file.filename) or 'narration.mp3'
         audio_path = audio_dir / audio_fn
-        audio_file.save(audio_path)
+        audio_sha256, audio_size = _save_upload(audio_file, audio_path, ref=f"project-audio:{project_id}")
 
         project_data = {
             'id': project_id,
@@ -866,12 +1975,13 @@ def create_project_from_audio():
             'created': ts,
             'audio_filename': audio_fn,
             'audio_path': str(Path('uploads') / 'audio' / audio_fn).replace('\\', '/'),
+            'audio_sha256': audio_sha256,
+            'audio_size': audio_size,
             'scenes': [],
             'transcript': ''
         }
 
-        with open(projects_dir / f"{project_id}.json", 'w', encoding='utf-8') as f:
-            json.dump(project_data, f, indent=2)
+        _save_project_data(projects_dir / f"{project_id}.json", project_data)
 
         return jsonify({'success': True, 'project_id': project_id, 'audio_filename': audio_fn})
     except Exception as e:
@@ -901,90 +2011,272 @@ def list_output():
         import traceback
         return jsonify({'success': False, 'error': str(e), 'trace': traceback.format_exc()}), 500
 
-@app.route('/api/list-projects', methods=['GET'])
-def list_projects():
-    projects_dir = BASE_DIR / 'projects'
-    projects = []
-    if projects_dir.exists():
-        for pf in projects_dir.glob('*.json'):
-            # Hide junk/command-named projects from UI
-            if pf.stem.endswith('_next') or pf.stem.endswith('_continue'):
-                continue
-            try:
-                data = json.loads(pf.read_text(encoding='utf-8'))
-                stem = pf.stem
-                created = 0
-                try:
-                    created = int(stem.split('_', 1)[0])
-                except Exception:
-                    try:
-                        created = int(data.get('created', 0) or 0)
-                    except Exception:
-                        created = 0
-
-                scenes = data.get('scenes', []) or []
-                image_count = 0
-                for s in scenes:
-                    try:
-                        if (s.get('scene_type') == 'image'):
-                            image_count += 1
-                    except Exception:
-                        pass
-
-                name = data.get('name', stem)
-                if str(name).strip().lower() in FORBIDDEN_PROJECT_NAMES:
-                    continue
-                proj_id = stem
-                projects.append({
-                    'created': created,
-                    'id': proj_id,
-                    'name': name,
-                    'scene_count': len(scenes),
-                    'image_count': image_count
-                })
-            except Exception:
-                pass
+# =============================================================================
+# PROJECT INDEX
+# =============================================================================
+# Memory-resident catalog of projects/*.json: summaries keyed by file stem plus
+# an id/name -> stem alias map. Kept current by _save_project_data(); a change
+# to the directory mtime (file created/deleted/renamed) triggers a rescan that
+# only re-parses files whose mtime moved.
 
-    projects.sort(key=lambda x: int(x.get("created") or 0), reverse=True)
-    return jsonify({'success': True, 'projects': projects})
+PROJECTS_DIR = BASE_DIR / 'projects'
 
+_project_index = {}
+_project_aliases = {}
+_project_index_sorted = None
+_project_index_dir_mtime = None
+_project_index_lock = threading.RLock()
 
 
+def _project_scene_counts(scenes):
+    """(scene_count, image_count) for a project's scenes list."""
+    scenes = scenes or []
+    image_count = 0
+    for s in scenes:
+        try:
+            if (s.get('scene_type') == 'image'):
+                image_count += 1
+        except Exception:
+            pass
+    return len(scenes), image_count
 
-def _resolve_project_file(key: str):
-    projects_dir = BASE_DIR / "projects"
-    # direct match by stem
-    fp = projects_dir / f"{key}.json"
-    if fp.exists():
-        return fp
 
-    # try matching by JSON id/name
-    if projects_dir.exists():
-        for cand in projects_dir.glob("*.json"):
-            try:
-                data = json.loads(cand.read_text(encoding="utf-8"))
-            except Exception:
-                continue
-            if data.get("id") == key or data.get("name") == key or cand.stem == key:
-                return cand
+def _project_summary(stem, data, mtime_ns):
+    created = 0
+    try:
+        created = int(stem.split('_', 1)[0])
+    except Exception:
+        try:
+            created = int(data.get('created', 0) or 0)
+        except Exception:
+            created = 0
 
-    return None
+    if isinstance(data.get('scene_count'), int) and isinstance(data.get('image_count'), int):
+        scene_count, image_count = data['scene_count'], data['image_count']
+    else:
+        scene_count, image_count = _project_scene_counts(data.get('scenes'))
 
+    name = data.get('name', stem)
+    return {
+        'created': created,
+        'id': stem,
+        'name': name,
+        'scene_count': scene_count,
+        'image_count': image_count,
+        # Hide junk/command-named projects from UI
+        'hidden': (stem.endswith('_next') or stem.endswith('_continue')
+                   or str(name).strip().lower() in FORBIDDEN_PROJECT_NAMES),
+        'aliases': [a for a in (data.get('id'), data.get('name')) if isinstance(a, str)],
+        'mtime_ns': mtime_ns,
+    }
 
 
-# ============================================
-# Create Project (explicit user action)
-# ============================================
-@app.route('/api/create-project', methods=['POST'])
-def create_project():
+def _project_index_drop(stem):
+    # Caller holds _project_index_lock
+    global _project_index_sorted
+    old = _project_index.pop(stem, None)
+    if old:
+        orphaned = {a for a in old['aliases'] if _project_aliases.get(a) == stem}
+        for alias in orphaned:
+            _project_aliases.pop(alias, None)
+        if orphaned:
+            # Hand each alias to another project that still carries it (oldest
+            # stem first), as a fresh scan would
+            for other in sorted(_project_index):
+                for alias in orphaned.intersection(_project_index[other]['aliases']):
+                    _project_aliases.setdefault(alias, other)
+    _project_index_sorted = None
+
+
+def _project_index_put(fp: Path, data=None):
+    """Index (or re-index) one project file; data is parsed from disk if not given."""
+    global _project_index_sorted
     try:
-        payload = request.get_json(silent=True) or {}
-        name = payload.get('name') or payload.get('project_name') or 'New Project'
-        # Guard names that conflict with navigation
-        if str(name).strip().lower() in FORBIDDEN_PROJECT_NAMES:
-            return jsonify({'success': False, 'error': 'Invalid project name'}), 400
-        safe_name = str(name).strip().replace('\n',' ').replace('\r',' ')
-        ts = int(time.time())
+        mtime_ns = fp.stat().st_mtime_ns
+        if data is None:
+            data = json.loads(fp.read_text(encoding='utf-8'))
+    except Exception:
+        with _project_index_lock:
+            _project_index_drop(fp.stem)
+        return None
+    summary = _project_summary(fp.stem, data, mtime_ns)
+    with _project_index_lock:
+        _project_index_drop(fp.stem)
+        _project_index[fp.stem] = summary
+        for alias in summary['aliases']:
+            _project_aliases.setdefault(alias, fp.stem)
+        _project_index_sorted = None
+    return summary
+
+
+def _project_index_refresh():
+    """Rescan projects/ if its mtime changed since the last scan."""
+    global _project_index_dir_mtime
+    try:
+        dir_mtime = PROJECTS_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        dir_mtime = None
+    with _project_index_lock:
+        if dir_mtime == _project_index_dir_mtime:
+            return
+        _project_index_dir_mtime = dir_mtime
+        seen = set()
+        if dir_mtime is not None:
+            for pf in PROJECTS_DIR.glob('*.json'):
+                seen.add(pf.stem)
+                cur = _project_index.get(pf.stem)
+                try:
+                    if cur and cur['mtime_ns'] == pf.stat().st_mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    continue
+                _project_index_put(pf)
+        for stem in [k for k in _project_index if k not in seen]:
+            _project_index_drop(stem)
+
+
+def _project_index_views():
+    """
+    Sorted views over visible projects, rebuilt only when the index changes.
+
+    'created' is ordered newest first by (-created, id); 'name' by
+    (lowercased name, -created, id) for prefix range lookups.
+    """
+    global _project_index_sorted
+    _project_index_refresh()
+    with _project_index_lock:
+        if _project_index_sorted is None:
+            visible = [p for p in _project_index.values() if not p['hidden']]
+            by_created = sorted(visible, key=lambda p: (-int(p.get('created') or 0), p['id']))
+            by_name = sorted(
+                (str(p['name']).lower(), -int(p.get('created') or 0), p['id'], p) for p in visible
+            )
+            _project_index_sorted = {
+                'created': by_created,
+                'created_keys': [(-int(p.get('created') or 0), p['id']) for p in by_created],
+                'name': [entry[3] for entry in by_name],
+                'name_keys': [entry[0] for entry in by_name],
+            }
+        return _project_index_sorted
+
+
+def _encode_project_cursor(summary):
+    raw = json.dumps([int(summary.get('created') or 0), summary['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_project_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created, proj_id = json.loads(raw)
+    return (-int(created), str(proj_id))
+
+
+@app.route('/api/list-projects', methods=['GET'])
+def list_projects():
+    """
+    List projects newest first, one page at a time.
+
+    Query params: limit (max 500; 100 when paging with a cursor), cursor
+    (next_cursor from the previous page), name_prefix (case-insensitive),
+    created_after / created_before (unix seconds, inclusive). Without limit
+    or cursor every matching project is returned in one response, as before
+    pagination existed.
+    """
+    try:
+        if request.args.get('limit') or request.args.get('cursor'):
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+        else:
+            limit = None
+        after_key = _decode_project_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        created_after = request.args.get('created_after', type=int)
+        created_before = request.args.get('created_before', type=int)
+    except Exception:
+        return jsonify({'success': False, 'error': 'Invalid pagination or filter parameters'}), 400
+    name_prefix = (request.args.get('name_prefix') or '').strip().lower()
+
+    views = _project_index_views()
+    if limit is None:
+        limit = max(len(views['created']), 1)
+    # Sort keys are (-created, id): newer projects have smaller keys
+    lo_key = (-created_before, '') if created_before is not None else None
+    hi_key = (-created_after, '\uffff') if created_after is not None else None
+
+    def in_range(key):
+        return ((lo_key is None or key >= lo_key)
+                and (after_key is None or key > after_key)
+                and (hi_key is None or key <= hi_key))
+
+    if name_prefix:
+        # Narrow to the name-prefix range first, then order that slice by date
+        start = bisect.bisect_left(views['name_keys'], name_prefix)
+        end = bisect.bisect_left(views['name_keys'], name_prefix + '\uffff')
+        matches = sorted(
+            (p for p in views['name'][start:end] if in_range((-int(p.get('created') or 0), p['id']))),
+            key=lambda p: (-int(p.get('created') or 0), p['id']),
+        )
+        page, has_more = matches[:limit], len(matches) > limit
+    else:
+        keys = views['created_keys']
+        start = max(
+            bisect.bisect_left(keys, lo_key) if lo_key is not None else 0,
+            bisect.bisect_right(keys, after_key) if after_key is not None else 0,
+        )
+        end = bisect.bisect_right(keys, hi_key) if hi_key is not None else len(keys)
+        page = views['created'][start:min(end, start + limit)]
+        has_more = start + limit < end
+
+    projects = [
+        {k: p[k] for k in ('created', 'id', 'name', 'scene_count', 'image_count')}
+        for p in page
+    ]
+    return jsonify({
+        'success': True,
+        'projects': projects,
+        'next_cursor': _encode_project_cursor(page[-1]) if page and has_more else None,
+    })
+
+
+
+
+def _resolve_project_file(key: str):
+    # direct match by stem
+    fp = PROJECTS_DIR / f"{key}.json"
+    if fp.exists():
+        return fp
+
+    # match by JSON id/name through the index
+    _project_index_refresh()
+    with _project_index_lock:
+        stem = _project_aliases.get(key)
+        summary = _project_index.get(stem) if stem else None
+    if not summary:
+        return None
+    cand = PROJECTS_DIR / f"{stem}.json"
+    try:
+        if cand.stat().st_mtime_ns != summary['mtime_ns']:
+            # Edited behind our back: re-index and make sure it still matches
+            summary = _project_index_put(cand)
+            if not summary or key not in summary['aliases']:
+                return None
+    except FileNotFoundError:
+        return None
+    return cand
+
+
+
+# ============================================
+# Create Project (explicit user action)
+# ============================================
+@app.route('/api/create-project', methods=['POST'])
+def create_project():
+    try:
+        payload = request.get_json(silent=True) or {}
+        name = payload.get('name') or payload.get('project_name') or 'New Project'
+        # Guard names that conflict with navigation
+        if str(name).strip().lower() in FORBIDDEN_PROJECT_NAMES:
+            return jsonify({'success': False, 'error': 'Invalid project name'}), 400
+        safe_name = str(name).strip().replace('\n',' ').replace('\r',' ')
+        ts = int(time.time())
         projects_dir = BASE_DIR / 'projects'
         projects_dir.mkdir(exist_ok=True)
         project_id = f"{ts}_{safe_name.replace(' ', '_')}"
@@ -1030,9 +2322,7 @@ def upload_project_audio(project_id):
         adir.mkdir(parents=True, exist_ok=True)
 
         dest = adir / filename
-        tmp = adir / (filename + '.uploading')
-        audio_file.save(tmp)
-        os.replace(tmp, dest)
+        sha256, size = _save_upload(audio_file, dest, ref=f"project-audio:{project_id}")
 
         rel_path = _audio_rel_path(project_id, filename)
         url = f"/audio/{project_id}/{filename}"
@@ -1043,11 +2333,13 @@ def upload_project_audio(project_id):
         data['audio']['filename'] = filename
         data['audio']['path'] = rel_path
         data['audio']['url'] = url
+        data['audio']['sha256'] = sha256
+        data['audio']['size'] = size
         data['audio']['uploaded_at'] = datetime.utcnow().isoformat() + 'Z'
 
         _save_project_data(fp, data)
 
-        return jsonify({'success': True, 'filename': filename, 'audio_path': rel_path, 'audio_url': url})
+        return jsonify({'success': True, 'filename': filename, 'audio_path': rel_path, 'audio_url': url, 'sha256': sha256})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1078,6 +2370,8 @@ def delete_project_audio(project_id):
                     fp_audio.unlink()
             except Exception:
                 pass
+        _blob_release(f"project-audio:{project_id}")
+        _blob_gc_soon()
 
         data.pop('audio_path', None)
         if isinstance(data.get('audio'), dict):
@@ -1141,7 +2435,7 @@ def project_transcribe_whisper(project_id):
             transcript_text = getattr(result, 'text', '') or str(result)
 
         project['transcript'] = transcript_text
-        project_path.write_text(json.dumps(project, indent=2), encoding='utf-8')
+        _save_project_data(project_path, project)
 
         return jsonify({'success': True, 'transcript_len': len(transcript_text)})
 
@@ -1153,85 +2447,144 @@ def project_transcribe_whisper(project_id):
 # ASS SUBTITLE GENERATION
 # =============================================================================
 
-def _generate_ass_subtitles(word_timestamps, output_path, log=None):
-    """
-    Generate an ASS subtitle file from word timestamps.
-
-    Args:
-        word_timestamps: List of dicts with {word, start, end} (times in seconds)
-        output_path: Path to write the .ass file
-        log: Optional logger
-
-    Returns:
-        True if subtitles were generated, False otherwise
-    """
-    if not word_timestamps or len(word_timestamps) == 0:
-        if log:
-            log.info("No word timestamps provided, skipping subtitle generation")
-        return False
-
-    # Group words into subtitle chunks (similar to frontend logic)
-    def group_words(words, max_words=6, max_chars=40, max_duration=3.5):
-        subtitles = []
-        current_words = []
-        current_text = ''
-
-        for w in words:
-            word_text = (w.get('word') or '').strip()
-            if not word_text:
-                continue
-
-            test_text = f"{current_text} {word_text}".strip() if current_text else word_text
-            current_duration = (w['end'] - current_words[0]['start']) if current_words else 0
-
-            # Check if we should start a new subtitle
-            should_break = (
-                len(current_words) >= max_words or
-                len(test_text) > max_chars or
-                current_duration > max_duration or
-                (current_text and current_text[-1] in '.!?')
-            )
-
-            if should_break and current_words:
-                subtitles.append({
-                    'text': current_text,
-                    'start': current_words[0]['start'],
-                    'end': current_words[-1]['end'],
-                })
-                current_words = []
-                current_text = ''
-
-            current_words.append(w)
-            current_text = f"{current_text} {word_text}".strip() if current_text else word_text
+# Group words into subtitle chunks (similar to frontend logic)
+def _group_subtitle_words(words, max_words=6, max_chars=40, max_duration=3.5):
+    subtitles = []
+    current_words = []
+    current_text = ''
+
+    for w in words:
+        word_text = (w.get('word') or '').strip()
+        if not word_text:
+            continue
+
+        test_text = f"{current_text} {word_text}".strip() if current_text else word_text
+        current_duration = (w['end'] - current_words[0]['start']) if current_words else 0
+
+        # Check if we should start a new subtitle
+        should_break = (
+            len(current_words) >= max_words or
+            len(test_text) > max_chars or
+            current_duration > max_duration or
+            (current_text and current_text[-1] in '.!?')
+        )
 
-        # Don't forget the last group
-        if current_words:
+        if should_break and current_words:
             subtitles.append({
                 'text': current_text,
                 'start': current_words[0]['start'],
                 'end': current_words[-1]['end'],
             })
+            current_words = []
+            current_text = ''
+
+        current_words.append(w)
+        current_text = f"{current_text} {word_text}".strip() if current_text else word_text
+
+    # Don't forget the last group
+    if current_words:
+        subtitles.append({
+            'text': current_text,
+            'start': current_words[0]['start'],
+            'end': current_words[-1]['end'],
+        })
 
-        return subtitles
-
-    # Convert seconds to ASS timecode format (H:MM:SS.cc)
-    def secs_to_ass_time(seconds):
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        centis = int((seconds % 1) * 100)
-        return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+    return subtitles
 
-    subtitles = group_words(word_timestamps)
 
-    if not subtitles:
-        if log:
-            log.info("No subtitle groups created from word timestamps")
-        return False
+def _group_subtitle_words_np(words, max_words=6, max_chars=40, max_duration=3.5):
+    """
+    Batched _group_subtitle_words: the same breaks, as (texts, starts, ends).
 
-    # ASS file header with styling
-    # Style: White text, bold, black outline, bottom center
-    ass_header = """[Script Info]
+    Instead of rebuilding the candidate text per word, group lengths come from
+    cumulative character counts, and the break point for a group starting at
+    every word is computed at once over arrays. Walking the groups is then one
+    step per subtitle.
+    """
+    stripped = [(w.get('word') or '').strip() for w in words]
+    kept = [i for i, t in enumerate(stripped) if t]
+    n = len(kept)
+    if not n:
+        return [], np.empty(0), np.empty(0)
+
+    texts = [stripped[i] for i in kept]
+    starts = np.array([words[i]['start'] for i in kept], dtype=np.float64)
+    ends = np.array([words[i]['end'] for i in kept], dtype=np.float64)
+    # Every group's text is a slice of the joined narration:
+    # joined[cum[a]:cum[b] - 1] == ' '.join(texts[a:b])
+    joined = ' '.join(texts)
+    cum = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=n) + 1, out=cum[1:])
+    codepoints = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    terminal = np.isin(codepoints[cum[1:] - 2], [ord('.'), ord('!'), ord('?')])
+
+    # next_start[a]: first word of the group after a group that starts at word a.
+    # Checked from the farthest candidate inward so the earliest break wins.
+    first = np.arange(n)
+    next_start = np.minimum(first + max_words, n)
+    for k in range(max_words - 1, 0, -1):
+        cand = first[:n - k] if k < n else first[:0]
+        j = cand + k
+        breaks = (
+            (cum[j + 1] - cum[cand] - 1 > max_chars) |
+            (ends[j] - starts[cand] > max_duration) |
+            terminal[j - 1]
+        )
+        next_start[:len(cand)][breaks] = j[breaks]
+
+    next_start = next_start.tolist()
+    group_starts = []
+    a = 0
+    while a < n:
+        group_starts.append(a)
+        a = next_start[a]
+    offsets = cum.tolist()
+    bounds = group_starts + [n]
+    group_texts = [joined[offsets[a]:offsets[b] - 1] for a, b in zip(bounds, bounds[1:])]
+    return group_texts, starts[group_starts], ends[np.asarray(bounds[1:]) - 1]
+
+
+def _subtitle_groups(word_timestamps):
+    """Subtitle chunks as (texts, starts, ends); NumPy-batched when numpy is installed."""
+    if np is not None:
+        return _group_subtitle_words_np(word_timestamps)
+    subtitles = _group_subtitle_words(word_timestamps)
+    return ([sub['text'] for sub in subtitles], [sub['start'] for sub in subtitles],
+            [sub['end'] for sub in subtitles])
+
+
+# Convert seconds to ASS timecode format (H:MM:SS.cc)
+def _secs_to_ass_time(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    centis = int((seconds % 1) * 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+_TWO_DIGITS = [f"{i:02d}" for i in range(100)]
+
+
+def _ass_times(seconds):
+    """_secs_to_ass_time over a sequence, with the arithmetic done in one NumPy pass."""
+    if np is None:
+        return [_secs_to_ass_time(t) for t in seconds]
+    t = np.asarray(seconds, dtype=np.float64)
+    hours = (t // 3600).astype(np.int64)
+    minutes = ((t % 3600) // 60).astype(np.int64)
+    secs = (t % 60).astype(np.int64)
+    centis = ((t % 1) * 100).astype(np.int64)
+    if len(t) and not (0 <= centis.min() and centis.max() < 100):
+        # (t % 1) * 100 can round up to 100; keep the scalar formatting for that
+        return [_secs_to_ass_time(x) for x in t.tolist()]
+    d = _TWO_DIGITS
+    return [f"{h}:{d[m]}:{d[s]}.{d[c]}" for h, m, s, c in
+            zip(hours.tolist(), minutes.tolist(), secs.tolist(), centis.tolist())]
+
+
+# ASS file header with styling
+# Style: White text, bold, black outline, bottom center
+ASS_HEADER = """[Script Info]
 Title: YVE Generated Subtitles
 ScriptType: v4.00+
 WrapStyle: 0
@@ -1248,27 +2601,86 @@ Style: Default,Arial,48,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,1,0,0,0,100,
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
 
-    # Generate dialogue lines
-    dialogue_lines = []
-    for sub in subtitles:
-        start_tc = secs_to_ass_time(sub['start'])
-        end_tc = secs_to_ass_time(sub['end'])
+
+def _ass_dialogue_lines(texts, starts, ends):
+    lines = []
+    for text, start_tc, end_tc in zip(texts, _ass_times(starts), _ass_times(ends)):
         # Escape special characters in text
-        text = sub['text'].replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
-        dialogue_lines.append(f"Dialogue: 0,{start_tc},{end_tc},Default,,0,0,0,,{text}")
+        text = text.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
+        lines.append(f"Dialogue: 0,{start_tc},{end_tc},Default,,0,0,0,,{text}")
+    return lines
+
+
+def _generate_ass_subtitles(word_timestamps, output_path, log=None):
+    """
+    Generate an ASS subtitle file from word timestamps.
+
+    Args:
+        word_timestamps: List of dicts with {word, start, end} (times in seconds)
+        output_path: Path to write the .ass file
+        log: Optional logger
+
+    Returns:
+        True if subtitles were generated, False otherwise
+    """
+    if not word_timestamps or len(word_timestamps) == 0:
+        if log:
+            log.info("No word timestamps provided, skipping subtitle generation")
+        return False
 
-    ass_content = ass_header + '\n'.join(dialogue_lines) + '\n'
+    texts, starts, ends = _subtitle_groups(word_timestamps)
+
+    if not texts:
+        if log:
+            log.info("No subtitle groups created from word timestamps")
+        return False
+
+    # Generate dialogue lines
+    dialogue_lines = _ass_dialogue_lines(texts, starts, ends)
+
+    ass_content = ASS_HEADER + '\n'.join(dialogue_lines) + '\n'
 
     # Write the file
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(ass_content)
 
     if log:
-        log.info("Generated ASS subtitle file with %d subtitle entries -> %s", len(subtitles), output_path)
+        log.info("Generated ASS subtitle file with %d subtitle entries -> %s", len(texts), output_path)
 
     return True
 
 
+def _generate_ass_slices(word_timestamps, ranges, log=None):
+    """
+    Split the subtitles into one ASS document per (start, end) time range.
+
+    Each range gets the subtitles that overlap it, clipped to the range and
+    shifted to range-local time, so a segment can burn its own slice while it
+    is encoded. Returns a list of ASS texts (None where a range has no
+    subtitles), or None if the timestamps produce no subtitles at all.
+    """
+    texts, starts, ends = _subtitle_groups(word_timestamps or [])
+    if not texts:
+        return None
+
+    slices = []
+    for t0, t1 in ranges:
+        if np is not None:
+            idx = np.flatnonzero((ends > t0) & (starts < t1))
+            lines = _ass_dialogue_lines([texts[i] for i in idx.tolist()],
+                                        np.maximum(starts[idx], t0) - t0, np.minimum(ends[idx], t1) - t0)
+        else:
+            idx = [i for i in range(len(texts)) if ends[i] > t0 and starts[i] < t1]
+            lines = _ass_dialogue_lines([texts[i] for i in idx],
+                                        [max(starts[i], t0) - t0 for i in idx],
+                                        [min(ends[i], t1) - t0 for i in idx])
+        slices.append(ASS_HEADER + '\n'.join(lines) + '\n' if lines else None)
+
+    if log:
+        log.info("Sliced %d subtitle entries across %d segments", len(texts), len(ranges))
+    return slices
+
+
 # =============================================================================
 # SUPABASE RENDER RECORD HELPER
 # =============================================================================
@@ -1318,15 +2730,1670 @@ def _update_render_in_supabase(supabase_url, service_role_key, render_id,
             log.error("Exception updating render in Supabase: %s", e)
 
 
+# =============================================================================
+# SCENE ASSET DOWNLOADS
+# =============================================================================
+
+# One pooled session and one concurrency slot pool per remote host
+_http_sessions = {}
+_http_host_slots = {}
+_http_pool_lock = threading.Lock()
+
+
+def _http_session_for(url):
+    """Return (session, semaphore) shared by every download from url's host."""
+    host = (urlparse(url).netloc or '').lower()
+    with _http_pool_lock:
+        session = _http_sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max(1, LOVABLE_DOWNLOAD_PER_HOST)
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_sessions[host] = session
+            _http_host_slots[host] = threading.BoundedSemaphore(max(1, LOVABLE_DOWNLOAD_PER_HOST))
+        return session, _http_host_slots[host]
+
+
+def _http_cache_key(url):
+    """Cache key for url: signed storage URLs drop their per-request token."""
+    parsed = urlparse(url)
+    if '/storage/v1/object/sign/' in parsed.path:
+        return parsed._replace(query='', fragment='').geturl()
+    return url
+
+
+def _http_cache_get(key):
+    row = _state_db().execute("SELECT * FROM http_cache WHERE url = ?", (key,)).fetchone()
+    return dict(row) if row else None
+
+
+def _http_cache_use(key, entry, ref, dest, result):
+    """Serve a cached entry into dest. False if its blob has been collected."""
+    if not _blob_link(entry['sha256'], ref, dest):
+        _state_db().execute("DELETE FROM http_cache WHERE url = ?", (key,))
+        _blob_release(f"http-cache:{key}")
+        return False
+    _state_db().execute("UPDATE http_cache SET last_used = ? WHERE url = ?", (time.time(), key))
+    _metric_inc('yve_http_cache_requests_total', result=result)
+    return True
+
+
+def _http_cache_store(key, tmp, sha256, size, headers):
+    """Keep a fresh response body (tmp) in the blob store and record its validators."""
+    immutable = 'immutable' in (headers.get('Cache-Control') or '').lower() or \
+        key.startswith(HTTP_CACHE_IMMUTABLE_PREFIXES)
+    now = time.time()
+    _blob_put(tmp, sha256, f"http-cache:{key}")
+    _state_db().execute(
+        "INSERT OR REPLACE INTO http_cache (url, sha256, size, etag, last_modified, immutable, fetched_at, last_used)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (key, sha256, size, headers.get('ETag'), headers.get('Last-Modified'), int(immutable), now, now),
+    )
+    _http_cache_evict()
+
+
+def _http_cache_evict():
+    """Drop least-recently-used entries until the cache fits HTTP_CACHE_MAX_BYTES."""
+    conn = _state_db()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+    if total <= HTTP_CACHE_MAX_BYTES:
+        return
+    for row in conn.execute("SELECT url, size FROM http_cache ORDER BY last_used").fetchall():
+        if total <= HTTP_CACHE_MAX_BYTES:
+            break
+        conn.execute("DELETE FROM http_cache WHERE url = ?", (row['url'],))
+        _blob_release(f"http-cache:{row['url']}")
+        total -= row['size']
+    _blob_gc_soon()
+
+
+def _download_to_file(url, dest: Path, timeout=300, ref=None):
+    """
+    Stream url to dest in chunks (never buffering the whole body), hashing as
+    it goes. Returns (bytes written, sha256 hex).
+
+    With ref, the body is kept in the blob store under that reference and
+    dest is a link to it. Bodies with validators go through the HTTP cache:
+    a cached copy is revalidated (304 means nothing is transferred), or used
+    as is when immutable.
+    """
+    key = _http_cache_key(url)
+    entry = _http_cache_get(key) if HTTP_CACHE_MAX_BYTES > 0 else None
+    if entry and entry['immutable']:
+        if _http_cache_use(key, entry, ref, dest, 'hit'):
+            return entry['size'], entry['sha256']
+        entry = None
+    headers = {}
+    if entry and entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    session, slot = _http_session_for(url)
+    tmp = dest.with_name(dest.name + '.part')
+    written = 0
+    h = hashlib.sha256()
+    started = time.perf_counter()
+    with slot:
+        with session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+            not_modified = r.status_code == 304 and entry is not None
+            if not not_modified:
+                r.raise_for_status()
+                with open(tmp, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            h.update(chunk)
+                            written += len(chunk)
+            response_headers = r.headers
+    if not_modified:
+        if _http_cache_use(key, entry, ref, dest, 'revalidated'):
+            return entry['size'], entry['sha256']
+        # The validated copy was collected meanwhile: fetch it unconditionally
+        return _download_to_file(url, dest, timeout, ref)
+    _record_transfer('download', written, time.perf_counter() - started)
+    sha256 = h.hexdigest()
+    cache_control = (response_headers.get('Cache-Control') or '').lower()
+    cacheable = HTTP_CACHE_MAX_BYTES > 0 and 'no-store' not in cache_control and (
+        response_headers.get('ETag') or response_headers.get('Last-Modified') or
+        'immutable' in cache_control or key.startswith(HTTP_CACHE_IMMUTABLE_PREFIXES))
+    if cacheable and written <= HTTP_CACHE_MAX_BYTES:
+        _metric_inc('yve_http_cache_requests_total', result='miss')
+        _http_cache_store(key, tmp, sha256, written, response_headers)
+        if not _blob_link(sha256, ref, dest):
+            raise RuntimeError(f"cached download of {url} vanished from the blob store")
+    else:
+        _metric_inc('yve_http_cache_requests_total', result='uncacheable')
+        if ref:
+            _blob_put(tmp, sha256, ref, dest)
+        else:
+            os.replace(tmp, dest)
+    return written, sha256
+
+
+def _plan_scene_files(scenes, render_dir: Path, log):
+    """
+    Map payload scenes to scene_files entries (in scene order) for the renderer.
+
+    Each entry records the source url, where it will be downloaded, its
+    duration and whether it is a video; scenes without media are skipped.
+    """
+    scene_files = []
+    for i, scene in enumerate(scenes):
+        video_url = scene.get('video_url')
+        img_url = scene.get('image_url')
+        scene_duration = float(scene.get('duration', 10) or 10)
+
+        if video_url:
+            scene_files.append({'url': video_url, 'path': str(render_dir / f"scene_{i:03d}_video.mp4"),
+                                'timeout': 300, 'duration': scene_duration, 'is_video': True})
+        elif img_url:
+            scene_files.append({'url': img_url, 'path': str(render_dir / f"scene_{i:03d}.png"),
+                                'timeout': 120, 'duration': scene_duration, 'is_video': False})
+        else:
+            log.warning("Scene %d has no image_url or video_url, skipping", i)
+    return scene_files
+
+
+def _download_scene_file(sf, log):
+    kind = 'video' if sf['is_video'] else 'image'
+    path = Path(sf['path'])
+    log.info("Downloading %s %s: %s", path.name, kind, sf['url'][:120])
+    size, sf['sha256'] = _download_to_file(sf['url'], path, timeout=sf['timeout'],
+                                           ref=f"render:{path.parent.name}/{path.name}")
+    log.info("Downloaded %s %s: %d bytes", Path(sf['path']).name, kind, size)
+    return size
+
+
+def _download_scene_assets(scene_files, job_id, log):
+    """
+    Download scene media concurrently, recording each file's sha256.
+
+    Progress is reported on the job in the 0-20% band.
+    """
+    pending = scene_files
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, LOVABLE_DOWNLOAD_WORKERS)) as pool:
+        futures = [pool.submit(_download_scene_file, sf, log) for sf in pending]
+        try:
+            for fut in as_completed(futures):
+                fut.result()
+                done += 1
+                _job_update(job_id, progress=int((done / max(len(pending), 1)) * 20))
+        except Exception:
+            for fut in futures:
+                fut.cancel()
+            raise
+
+
+# =============================================================================
+# INCREMENTAL RE-RENDER MANIFEST
+# =============================================================================
+# After a successful multi-step render, OUTPUT_DIR/<project_id>/render_manifest.json
+# maps each scene's input signature to the segment-cache key of its encode. The
+# next render of that project reuses those segments; only scenes whose content,
+# duration, type or profile changed are encoded. Sources are still fetched, so
+# media replaced at the same URL is noticed; unchanged ones come from the HTTP
+# cache (a 304 revalidation, or no request at all when immutable).
+
+def _render_manifest_path(project_id):
+    return OUTPUT_DIR / str(project_id) / 'render_manifest.json'
+
+
+def _scene_signature(sf, profile_name, length, boundary_keyframes=False):
+    # length is the segment's encoded length (see _segment_lengths), not the scene duration.
+    # Keyed on the downloaded content, not the URL: uploads overwrite objects in place
+    parts = [sf['sha256'], bool(sf['is_video']), repr(length), profile_name]
+    if boundary_keyframes:
+        parts.append('boundary-keyframes')
+    if sf.get('subtitles'):
+        parts.append(hashlib.sha256(sf['subtitles'].encode('utf-8')).hexdigest())
+    payload = json.dumps(parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _load_render_manifest(project_id):
+    """signature -> segment cache key from the project's last successful render."""
+    mp = _render_manifest_path(project_id)
+    try:
+        data = json.loads(mp.read_text(encoding='utf-8'))
+    except Exception:
+        return {}
+    return {s['signature']: s['cache_key'] for s in data.get('scenes', []) if s.get('cache_key')}
+
+
+def _save_render_manifest(project_id, render_id, profile_name, scene_files, boundary_keyframes=False):
+    mp = _render_manifest_path(project_id)
+    mp.parent.mkdir(parents=True, exist_ok=True)
+    lengths = _segment_lengths(scene_files, RENDER_PROFILES[profile_name])
+    data = {
+        'project_id': str(project_id),
+        'render_id': str(render_id),
+        'profile': profile_name,
+        'updated_at': datetime.utcnow().isoformat() + 'Z',
+        'scenes': [
+            {'signature': _scene_signature(sf, profile_name, length, boundary_keyframes), 'cache_key': sf.get('cache_key')}
+            for sf, length in zip(scene_files, lengths)
+        ],
+    }
+    tmp = mp.with_suffix('.json.tmp')
+    tmp.write_text(json.dumps(data, indent=2), encoding='utf-8')
+    os.replace(tmp, mp)
+
+
+def _mark_reusable_scenes(project_id, profile_name, scene_files, log, boundary_keyframes=False):
+    """
+    Flag scenes unchanged since the last render whose segment is still cached. Returns the count.
+
+    Runs after the downloads: signatures need each scene's sha256.
+    """
+    previous = _load_render_manifest(project_id)
+    lengths = _segment_lengths(scene_files, RENDER_PROFILES[profile_name])
+    reusable = 0
+    for sf, length in zip(scene_files, lengths):
+        key = previous.get(_scene_signature(sf, profile_name, length, boundary_keyframes))
+        if key and _segment_cache_path(key).exists():
+            sf['reuse_key'] = key
+            reusable += 1
+    if previous:
+        log.info("Incremental render: %d/%d scenes unchanged since last render", reusable, len(scene_files))
+    return reusable
+
+
+# =============================================================================
+# SEGMENT ENCODING
+# =============================================================================
+
+def _communicate_with_progress(proc, timeout, on_progress):
+    """
+    proc.communicate() for ffmpeg run with -progress pipe:1: calls
+    on_progress(seconds) for each out_time_us report on stdout while stderr is
+    drained on a side thread. Raises TimeoutExpired after killing proc.
+    """
+    stderr_chunks = []
+    drain = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        for line in proc.stdout:
+            key, _, value = line.decode('ascii', errors='replace').strip().partition('=')
+            if key == 'out_time_us' and value.isdigit():
+                on_progress(int(value) / 1e6)
+        proc.wait()
+    finally:
+        timer.cancel()
+        drain.join()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(proc.args, timeout)
+    return b'', b''.join(stderr_chunks)
+
+
+def _run_ffmpeg(cmd, timeout, label, log, on_progress=None):
+    """
+    Run one ffmpeg command. Raises with the stderr tail on timeout or failure; returns stderr text.
+
+    With on_progress, ffmpeg reports its output position and on_progress(seconds)
+    is called as encoding advances.
+    """
+    global _ffmpeg_running
+    if on_progress:
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    with _metrics_lock:
+        _ffmpeg_running += 1
+    try:
+        if on_progress:
+            stdout, stderr = _communicate_with_progress(proc, timeout, on_progress)
+        else:
+            stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()  # drain pipes after kill
+        log.error("FFmpeg %s TIMED OUT after %ds, killed", label, timeout)
+        _metric_inc('yve_ffmpeg_processes_total', result='timeout')
+        raise Exception(f"FFmpeg {label} timed out after {timeout}s")
+    finally:
+        with _metrics_lock:
+            _ffmpeg_running -= 1
+
+    stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
+    _metric_inc('yve_ffmpeg_processes_total', result='ok' if proc.returncode == 0 else 'failed')
+    if proc.returncode != 0:
+        log.error("FFmpeg %s FAILED (rc=%d)\nSTDERR:\n%s", label, proc.returncode, stderr_text[-3000:])
+        raise Exception(f"FFmpeg {label} failed (rc={proc.returncode}): {stderr_text[-2000:]}")
+    return stderr_text
+
+
+def _segment_encode_plan(segment_count):
+    """Return (workers, threads_per_worker) for encoding segment_count segments."""
+    cores = os.cpu_count() or 1
+    workers = max(1, min(SEGMENT_ENCODE_WORKERS, cores, segment_count))
+    return workers, max(1, cores // workers)
+
+
+def _scale_pad_filter(profile):
+    """Letterbox any source into the profile's frame size."""
+    w, h = profile['width'], profile['height']
+    return f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2"
+
+
+def _source_fits_profile(info, profile):
+    """True if a probed video already has the profile's frame size (square pixels), so needs no scale/pad."""
+    return bool(info) and not info.get('is_image') and \
+        info.get('width') == profile['width'] and info.get('height') == profile['height'] and \
+        info.get('sample_aspect_ratio') in (None, '1:1', '0:1', 'N/A')
+
+
+def _x264_args(profile):
+    return ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-preset', profile['preset'], '-crf', str(profile['crf'])]
+
+
+def _boundary_frames(profile):
+    """Crossfade length in whole frames (transitions start and end on frame boundaries)."""
+    return max(1, round(CROSSFADE_DURATION * profile['fps']))
+
+
+def _crossfade_seconds(profile):
+    """CROSSFADE_DURATION rounded to whole frames of the profile."""
+    return _boundary_frames(profile) / profile['fps']
+
+
+def _segment_frame_count(duration, profile):
+    # -t duration at -r fps emits every frame whose timestamp is < duration
+    return math.ceil(duration * profile['fps'] - 1e-9)
+
+
+def _segment_keyframe_times(duration, profile):
+    """
+    Times to force keyframes at so a segment splits into head | body | tail.
+
+    The head and tail are one crossfade long. Returns None if the segment is
+    too short to have a body.
+    """
+    fps, fk = profile['fps'], _boundary_frames(profile)
+    frames = _segment_frame_count(duration, profile)
+    if frames <= 2 * fk:
+        return None
+    # Slightly early so the intended frame is the first at-or-after each time
+    return [fk / fps - 0.001, (frames - fk) / fps - 0.001]
+
+
+def _segment_lengths(scene_files, profile):
+    """
+    Seconds to encode each segment (always a whole number of frames).
+
+    Scene i starts at the frame nearest the sum of the earlier scene
+    durations. Every segment but the last also runs one crossfade into the
+    next scene, which the crossfade overlaps, so the stitched video is as long
+    as the scenes together and stays in sync with the narration.
+    """
+    fps, fk = profile['fps'], _boundary_frames(profile)
+    edges = [0]
+    total = 0.0
+    for sf in scene_files:
+        total += max(0.5, float(sf['duration']))
+        edges.append(round(total * fps))
+    last = len(scene_files) - 1
+    return [(max(1, edges[i + 1] - edges[i]) + (fk if i < last else 0)) / fps for i in range(len(scene_files))]
+
+
+def _segment_timeline(scene_files, profile):
+    """(start, end) of each segment in the stitched video, given the crossfades the stitcher applies."""
+    fade = _crossfade_seconds(profile)
+    ranges = []
+    start = 0.0
+    for length in _segment_lengths(scene_files, profile):
+        ranges.append((start, start + length))
+        start += length - fade
+    return ranges
+
+
+def _plan_segment_subtitles(scene_files, word_timestamps, profile, log):
+    """
+    Give each scene entry the slice of subtitles that falls inside its segment.
+
+    Sets sf['subtitles'] to ASS text (or None) so the segment encode burns it
+    in, instead of re-encoding the stitched video just to add subtitles.
+    Returns False if there is nothing to burn per segment.
+    """
+    try:
+        slices = _generate_ass_slices(word_timestamps, _segment_timeline(scene_files, profile), log)
+    except Exception as e:
+        log.warning("Could not slice subtitles per segment (%s), burning them separately", e)
+        slices = None
+    for i, sf in enumerate(scene_files):
+        sf['subtitles'] = slices[i] if slices else None
+    return slices is not None
+
+
+def _build_segment_cmd(sf, segment_path, duration, threads, profile, boundary_keyframes=False,
+                       subtitles_path=None, source_info=None):
+    """
+    ffmpeg argv that turns one downloaded scene file into a segment in the given profile.
+
+    duration is the segment length from _segment_lengths. source_info is the
+    video's inspection result; a source that already has the profile's frame
+    size skips the scale/pad pass.
+    """
+    # Video scene: trim to duration (holding the last frame if the clip is
+    # shorter); image scene: static image -> video with loop
+    source = ['-i', sf['path']] if sf.get('is_video') else ['-loop', '1', '-i', sf['path']]
+    keyframes = _segment_keyframe_times(duration, profile) if boundary_keyframes else None
+    filters = [] if sf.get('is_video') and _source_fits_profile(source_info, profile) else [_scale_pad_filter(profile)]
+    if sf.get('is_video'):
+        filters.insert(0, f"tpad=stop_mode=clone:stop_duration={duration:.3f}")
+    if subtitles_path:
+        # Subtitle slices are in segment-local time, so start the clock at zero
+        filters = ['setpts=PTS-STARTPTS', *filters, _ass_filter_arg(subtitles_path)]
+    return [
+        'ffmpeg', '-y',
+        *source,
+        '-t', str(duration),
+        *(['-vf', ','.join(filters)] if filters else []),
+        '-r', str(profile['fps']),
+        *_x264_args(profile),
+        *(['-force_key_frames', ','.join(f"{t:.3f}" for t in keyframes)] if keyframes else []),
+        '-threads', str(threads),
+        '-an',
+        str(segment_path)
+    ]
+
+
+def _file_sha256(path):
+    """Hex sha256 of a file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link_or_copy(src, dest):
+    """Hard-link src to dest (same filesystem), falling back to a copy."""
+    dest = Path(dest)
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+# Running total of SEGMENT_CACHE_DIR size; None until the first scan
+_segment_cache_bytes = None
+_segment_cache_lock = threading.Lock()
+
+
+def _segment_cache_key(source_sha, duration, cmd, source_path, segment_path, subtitles=None):
+    """
+    Cache key for one segment encode: source bytes, duration and the ffmpeg argv.
+
+    Job-specific paths are replaced with placeholders and the -threads value is
+    dropped, so the same encode in another job (or on another worker plan) hits.
+    subtitles is (ass_path, ass_text) when the encode burns a subtitle slice;
+    the text is hashed in place of its path.
+    """
+    if subtitles:
+        ass_arg = _ass_filter_arg(subtitles[0])
+        cmd = [arg.replace(ass_arg, 'ass={subtitles}') for arg in cmd]
+    argv = []
+    skip_next = False
+    for arg in cmd:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg == '-threads':
+            skip_next = True
+            continue
+        argv.append('{input}' if arg == str(source_path) else '{output}' if arg == str(segment_path) else arg)
+    payload = [source_sha, repr(float(duration)), argv]
+    if subtitles:
+        payload.append(hashlib.sha256(subtitles[1].encode('utf-8')).hexdigest())
+    payload = json.dumps(payload)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _segment_cache_path(key):
+    return SEGMENT_CACHE_DIR / key[:2] / f"{key}.mp4"
+
+
+def _segment_cache_fetch(key, dest):
+    """Place the cached segment for key at dest. Returns False on a miss."""
+    cached = _segment_cache_path(key)
+    try:
+        os.utime(cached)  # mtime doubles as the LRU timestamp
+        _link_or_copy(cached, dest)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _segment_cache_store(key, src):
+    """Add a freshly encoded segment to the cache, then evict down to the size cap."""
+    global _segment_cache_bytes
+    cached = _segment_cache_path(key)
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_name(f"{cached.name}.{uuid.uuid4().hex}.tmp")
+    _link_or_copy(src, tmp)
+    os.replace(tmp, cached)
+    with _segment_cache_lock:
+        if _segment_cache_bytes is None:
+            _segment_cache_bytes = sum(p.stat().st_size for p in SEGMENT_CACHE_DIR.glob('*/*.mp4'))
+        else:
+            _segment_cache_bytes += cached.stat().st_size
+        if _segment_cache_bytes > SEGMENT_CACHE_MAX_BYTES:
+            _segment_cache_evict()
+
+
+def _segment_cache_evict():
+    """Drop least-recently-used segments until the cache fits. Caller holds _segment_cache_lock."""
+    global _segment_cache_bytes
+    entries = []
+    for p in SEGMENT_CACHE_DIR.glob('*/*.mp4'):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in entries:
+        if total <= SEGMENT_CACHE_MAX_BYTES:
+            break
+        try:
+            p.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
+    _segment_cache_bytes = total
+
+
+def _render_segments(scene_files, render_dir: Path, job_id, profile, log, boundary_keyframes=False):
+    """
+    Encode every scene into segment_{i:03d}.mp4 with a pool of ffmpeg workers.
+
+    Scenes flagged reuse_key (unchanged since the last render) and segments
+    already in the segment cache are linked in instead of re-encoded; counts are
+    reported as the job's segment_cache and segments_reused. Each entry's
+    cache_key is recorded for the render manifest. Returns segment paths in scene
+    order. Progress is reported on the job in the 20-70% band, and per-segment
+    time, source and bytes in/out as segment_stats. With
+    boundary_keyframes, keyframes are forced at the crossfade cut points.
+
+    Entries carrying a subtitle slice (sf['subtitles']) burn it during the
+    encode. If that fails the segment is encoded without it and
+    sf['subtitles_burned'] is set False so the caller can burn separately.
+    """
+    total = len(scene_files)
+    workers, threads = _segment_encode_plan(total)
+    log.info("Encoding %d segments with %d ffmpeg workers x %d threads", total, workers, threads)
+    segment_paths = [render_dir / f"segment_{i:03d}.mp4" for i in range(total)]
+    lengths = _segment_lengths(scene_files, profile)
+
+    cache_stats = {'hits': 0, 'misses': 0}
+    reused = [0]
+    stats_lock = threading.Lock()
+    segment_stats = [None] * total
+
+    def count(kind):
+        _metric_inc('yve_segment_cache_requests_total',
+                    result={'hits': 'hit', 'misses': 'miss'}.get(kind, kind))
+        with stats_lock:
+            if kind == 'reused':
+                reused[0] += 1
+            else:
+                cache_stats[kind] += 1
+            _job_update(job_id, segment_cache=dict(cache_stats), segments_reused=reused[0])
+
+    def encode(i):
+        started = time.perf_counter()
+        source = produce(i)
+        elapsed = time.perf_counter() - started
+        try:
+            bytes_in = Path(scene_files[i]['path']).stat().st_size if source != 'reused' else 0
+        except OSError:
+            bytes_in = 0
+        bytes_out = segment_paths[i].stat().st_size
+        segment_stats[i] = {'index': i, 'source': source, 'seconds': round(elapsed, 3),
+                            'bytes_in': bytes_in, 'bytes_out': bytes_out}
+        _metric_observe('yve_segment_encode_seconds', elapsed, source=source)
+        _metric_inc('yve_segment_bytes_total', bytes_in, direction='in')
+        _metric_inc('yve_segment_bytes_total', bytes_out, direction='out')
+
+    def run_encode(i, cmd):
+        # The segment may be a hard link into the segment cache; ffmpeg -y would
+        # truncate and rewrite that shared inode, so always encode to a new file
+        segment_paths[i].unlink(missing_ok=True)
+        return _run_ffmpeg(cmd, SEGMENT_TIMEOUT, f"segment {i}", log)
+
+    def produce(i):
+        """Put segment i in place; returns 'reused', 'cache' or 'encoded'."""
+        sf = scene_files[i]
+        if sf.get('reuse_key') and _segment_cache_fetch(sf['reuse_key'], segment_paths[i]):
+            sf['cache_key'] = sf['reuse_key']
+            count('reused')
+            log.info("Segment %d/%d reused from last render -> %s", i + 1, total, segment_paths[i].name)
+            return 'reused'
+
+        duration = lengths[i]
+        if not sf.get('sha256'):
+            sf['sha256'] = _file_sha256(sf['path'])
+        source_info = None
+        if sf.get('is_video'):
+            try:
+                source_info = _inspect_media(sf['path'], sf['sha256']).result(timeout=MEDIA_PROBE_TIMEOUT * 2)
+            except Exception as e:
+                log.warning("Could not inspect segment %d source: %s", i, e)
+        subtitles = None
+        if sf.get('subtitles'):
+            subtitles = (render_dir / f"subtitles_{i:03d}.ass", sf['subtitles'])
+            subtitles[0].write_text(subtitles[1], encoding='utf-8')
+        cmd = _build_segment_cmd(sf, segment_paths[i], duration, threads, profile, boundary_keyframes,
+                                 subtitles_path=subtitles[0] if subtitles else None, source_info=source_info)
+        key = _segment_cache_key(sf['sha256'], duration, cmd, sf['path'], str(segment_paths[i]),
+                                 subtitles=subtitles)
+        sf['cache_key'] = key
+        if _segment_cache_fetch(key, segment_paths[i]):
+            count('hits')
+            log.info("Segment %d/%d cache hit -> %s", i + 1, total, segment_paths[i].name)
+            return 'cache'
+
+        count('misses')
+        media_type = 'video' if sf.get('is_video') else 'image'
+        log.info("FFmpeg segment %d/%d (%s) cmd: %s", i + 1, total, media_type, ' '.join(cmd))
+        try:
+            stderr_text = run_encode(i, cmd)
+        except Exception:
+            if not subtitles:
+                raise
+            log.warning("Segment %d subtitle burn failed, encoding it without subtitles", i)
+            sf['subtitles_burned'] = False
+            cmd = _build_segment_cmd(sf, segment_paths[i], duration, threads, profile, boundary_keyframes,
+                                     source_info=source_info)
+            key = _segment_cache_key(sf['sha256'], duration, cmd, sf['path'], str(segment_paths[i]))
+            sf['cache_key'] = key
+            stderr_text = run_encode(i, cmd)
+        log.info("FFmpeg segment %d/%d OK -> %s (stderr=%d bytes)", i + 1, total, segment_paths[i].name, len(stderr_text))
+        try:
+            _segment_cache_store(key, segment_paths[i])
+        except Exception as e:
+            log.warning("Could not cache segment %d: %s", i, e)
+        return 'encoded'
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(encode, i) for i in range(total)]
+        try:
+            for fut in as_completed(futures):
+                fut.result()
+                done += 1
+                _job_update(job_id, progress=20 + int((done / total) * 50),
+                            message=f"Rendered segment {done}/{total}")
+        except Exception:
+            for fut in futures:
+                fut.cancel()
+            raise
+
+    _job_update(job_id, segment_stats=segment_stats)
+    return [str(p) for p in segment_paths]
+
+
+# =============================================================================
+# STITCHING, AUDIO MERGE AND SUBTITLE BURN
+# =============================================================================
+
+CROSSFADE_DURATION = 0.5  # Crossfade duration in seconds
+
+
+def _xfade_filter_chain(labels, durations, fade_duration):
+    """
+    Chain xfade filters across the given input labels (e.g. '[0:v]').
+
+    Returns (filter_parts, final_label). Each xfade starts fade_duration before
+    the end of the stream built so far, and every earlier transition has already
+    shortened that stream by one fade_duration:
+    offset = cumulative_duration - (transitions so far + 1) * fade_duration
+
+    durations are the clip lengths. Clips from _segment_lengths run one
+    fade_duration past their scene, so each fade starts exactly where the next
+    scene begins and the output is as long as the scenes together.
+    """
+    filter_parts = []
+    cumulative_duration = 0
+
+    for i in range(len(labels) - 1):
+        cumulative_duration += durations[i]
+
+        # Offset is when the fade starts (subtract fade_duration per transition)
+        offset = cumulative_duration - (i + 1) * fade_duration
+
+        # First transition: [0:v][1:v]xfade...; subsequent: [vN][N+1:v]xfade...
+        first = labels[0] if i == 0 else f"[v{i}]"
+        filter_parts.append(
+            f"{first}{labels[i+1]}xfade=transition=fade:duration={fade_duration:.6f}:offset={offset:.6f}[v{i+1}]"
+        )
+
+    return filter_parts, f"[v{len(labels)-1}]" if len(labels) > 1 else labels[0]
+
+
+def _xfade_duration(durations, fade_duration):
+    """Length of the stream produced by crossfading clips of the given durations."""
+    return sum(durations) - (len(durations) - 1) * fade_duration
+
+
+def _xfade_files(files, durations, output, profile, timeout, label, log, threads=None):
+    """Crossfade a list of clips (of the given lengths) into output with one xfade chain."""
+    inputs = []
+    for seg in files:
+        inputs.extend(['-i', str(seg)])
+
+    filter_parts, final_label = _xfade_filter_chain(
+        [f"[{i}:v]" for i in range(len(files))], durations, _crossfade_seconds(profile)
+    )
+    xfade_cmd = [
+        'ffmpeg', '-y',
+        *inputs,
+        '-filter_complex', ';'.join(filter_parts),
+        '-map', final_label,
+        *_x264_args(profile),
+        *(['-threads', str(threads)] if threads else []),
+        '-an',
+        str(output)
+    ]
+    log.info("FFmpeg %s cmd: %s", label, ' '.join(xfade_cmd[:20]) + '...')
+    _run_ffmpeg(xfade_cmd, timeout, label, log)
+
+
+def _xfade_grouped(segment_files, durations, render_dir: Path, output, profile, log):
+    """
+    Crossfade many segments in fixed-size groups instead of one giant graph.
+
+    Each group of XFADE_GROUP_SIZE segments is crossfaded in one ffmpeg run,
+    trimmed to exclude the crossfades into its neighbours. The crossfade
+    between two groups is encoded on its own from the last segment's tail and
+    the next segment's head. The groups and transitions are then joined by
+    stream copy. Every frame is encoded once from the segments, and no ffmpeg
+    process opens more than XFADE_GROUP_SIZE inputs or encodes more than one
+    group.
+    """
+    fps, fk = profile['fps'], _boundary_frames(profile)
+    fade = fk / fps
+    frames = [round(d * fps) for d in durations]
+    group_size = max(2, XFADE_GROUP_SIZE)
+    groups = [list(range(i, min(i + group_size, len(segment_files)))) for i in range(0, len(segment_files), group_size)]
+    workers, threads = _segment_encode_plan(len(groups))
+    log.info("Grouped crossfade: %d segments in %d groups (%d workers)", len(segment_files), len(groups), workers)
+
+    def body(g):
+        idx = groups[g]
+        labels = [f"[{n}:v]" for n in range(len(idx))]
+        filter_parts, label = _xfade_filter_chain(labels, [durations[i] for i in idx], fade)
+        # Drop the frames that belong to the crossfades with the neighbouring groups
+        length = sum(frames[i] for i in idx) - (len(idx) - 1) * fk
+        first = fk if g > 0 else 0
+        last = length - fk if g < len(groups) - 1 else length
+        filter_parts.append(f"{label}trim=start_frame={first}:end_frame={last},setpts=PTS-STARTPTS[body]")
+        out = render_dir / f"stitch_group_{g:03d}.mp4"
+        inputs = [arg for i in idx for arg in ('-i', str(segment_files[i]))]
+        _run_ffmpeg([
+            'ffmpeg', '-y', *inputs, '-filter_complex', ';'.join(filter_parts), '-map', '[body]',
+            *_x264_args(profile), '-threads', str(threads), '-an', str(out)
+        ], XFADE_GROUP_TIMEOUT, f"xfade group {g}", log)
+        return out
+
+    def transition(g):
+        a, b = groups[g][-1], groups[g + 1][0]
+        out = render_dir / f"stitch_transition_{g:03d}.mp4"
+        _run_ffmpeg([
+            'ffmpeg', '-y', '-i', str(segment_files[a]), '-i', str(segment_files[b]),
+            '-filter_complex',
+            # xfade needs a known frame rate, which trim/setpts leave unset
+            f"[0:v]trim=start_frame={frames[a] - fk},setpts=PTS-STARTPTS,fps={fps}[t];"
+            f"[1:v]trim=end_frame={fk},setpts=PTS-STARTPTS,fps={fps}[h];"
+            f"[t][h]xfade=transition=fade:duration={fade:.6f}:offset=0[v]",
+            '-map', '[v]', *_x264_args(profile), '-threads', str(threads), '-an', str(out)
+        ], 120, f"group transition {g}", log)
+        return out
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        bodies = list(pool.map(body, range(len(groups))))
+        transitions = list(pool.map(transition, range(len(groups) - 1)))
+
+    sequence = []
+    for g, piece in enumerate(bodies):
+        sequence.append(piece)
+        if g < len(transitions):
+            sequence.append(transitions[g])
+    _concat_copy(sequence, render_dir, output, log)
+
+
+def _stitch_boundary(segment_files, scene_files, render_dir: Path, profile, log):
+    """
+    Crossfade by re-encoding only the transition windows.
+
+    Segments were encoded with keyframes at the crossfade cut points, so each
+    one is split by stream copy into head | body | tail. Only tail(i) x head(i+1)
+    is crossfaded and encoded; bodies are stream-copied through the concat
+    demuxer. Stitch time scales with the number of transitions, not the video
+    length. Raises if a segment cannot be split cleanly.
+    """
+    fps, fk = profile['fps'], _boundary_frames(profile)
+    fade = fk / fps
+    count = len(segment_files)
+    workers, threads = _segment_encode_plan(count)
+    lengths = _segment_lengths(scene_files, profile)
+
+    def split(i):
+        duration = lengths[i]
+        times = _segment_keyframe_times(duration, profile)
+        if not times:
+            raise Exception(f"segment {i} is too short for boundary stitching")
+        actual = _ffprobe_duration_seconds(Path(segment_files[i]))
+        expected = _segment_frame_count(duration, profile) / fps
+        if actual is None or abs(actual - expected) > 1.5 / fps:
+            raise Exception(f"segment {i} is {actual}s, expected {expected:.3f}s")
+        pattern = render_dir / f"cut_{i:03d}_%d.mp4"
+        _run_ffmpeg([
+            'ffmpeg', '-y', '-i', str(segment_files[i]), '-map', '0', '-c', 'copy',
+            '-f', 'segment', '-segment_format', 'mp4',
+            '-segment_times', ','.join(f"{t:.3f}" for t in times),
+            '-reset_timestamps', '1', str(pattern)
+        ], 120, f"boundary split {i}", log)
+        pieces = [render_dir / f"cut_{i:03d}_{n}.mp4" for n in range(3)]
+        if not all(p.exists() for p in pieces) or (render_dir / f"cut_{i:03d}_3.mp4").exists():
+            raise Exception(f"segment {i} did not split into head/body/tail at its keyframes")
+        return pieces
+
+    def transition(i):
+        out = render_dir / f"transition_{i:03d}.mp4"
+        _run_ffmpeg([
+            'ffmpeg', '-y', '-i', str(cuts[i][2]), '-i', str(cuts[i + 1][0]),
+            '-filter_complex', f"[0:v][1:v]xfade=transition=fade:duration={fade:.6f}:offset=0[v]",
+            '-map', '[v]', *_x264_args(profile), '-threads', str(threads), '-an', str(out)
+        ], 120, f"transition {i}", log)
+        return out
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        cuts = list(pool.map(split, range(count)))
+        transitions = list(pool.map(transition, range(count - 1)))
+
+    # head(0) body(0) T(0) body(1) T(1) ... body(n-1) tail(n-1)
+    sequence = [cuts[0][0]]
+    for i in range(count):
+        sequence.append(cuts[i][1])
+        if i < count - 1:
+            sequence.append(transitions[i])
+    sequence.append(cuts[-1][2])
+    log.info("Boundary stitch: %d transitions encoded, %d bodies stream-copied", len(transitions), count)
+    return sequence
+
+
+def _concat_copy(segment_files, render_dir: Path, output, log):
+    """Hard-cut concat of the segments (stream copy)."""
+    concat_list = render_dir / 'concat.txt'
+    with open(concat_list, 'w', encoding='utf-8') as f:
+        for seg in segment_files:
+            f.write(f"file '{seg}'\n")
+
+    concat_cmd = ['ffmpeg','-y','-f','concat','-safe','0','-i', str(concat_list), '-c','copy', str(output)]
+    _run_ffmpeg(concat_cmd, 600, 'concat', log)
+
+
+def _concat_trimmed(segment_files, frame_counts, output, profile, timeout, log):
+    """
+    Hard-cut join of the first frame_counts[i] frames of each segment.
+
+    Re-encodes once: a stream-copy cut (concat demuxer outpoint) goes by decode
+    order and keeps reordered B-frames past the cut, which shifts every later scene.
+    """
+    inputs, filter_parts = [], []
+    for i, (seg, count) in enumerate(zip(segment_files, frame_counts)):
+        inputs.extend(['-i', str(seg)])
+        filter_parts.append(f"[{i}:v]trim=end_frame={count},setpts=PTS-STARTPTS[c{i}]")
+    filter_parts.append(''.join(f"[c{i}]" for i in range(len(segment_files)))
+                        + f"concat=n={len(segment_files)}:v=1:a=0,fps={profile['fps']}[v]")
+    _run_ffmpeg([
+        'ffmpeg', '-y', *inputs, '-filter_complex', ';'.join(filter_parts), '-map', '[v]',
+        *_x264_args(profile), '-an', str(output)
+    ], timeout, 'concat fallback', log)
+
+
+def _stitch_segments(segment_files, scene_files, render_dir: Path, profile, log, stitch_mode=None, job_id=None):
+    """
+    Crossfade the segments into render_dir/silent.mp4 (hard-cut concat as a fallback,
+    recorded as the job's stitch_fallback).
+
+    stitch_mode 'chain' runs one xfade chain over every segment; 'chunked'
+    (default) switches to the grouped stitcher once there are more than
+    XFADE_GROUP_SIZE segments; 'boundary' re-encodes only the transition
+    windows (falling back to 'chunked' if the segments cannot be split).
+    """
+    log.info("Concatenating %d segments with crossfade transitions...", len(segment_files))
+    silent_video = render_dir / 'silent.mp4'
+
+    if len(segment_files) == 1:
+        # Single segment - just copy it
+        shutil.copy2(segment_files[0], silent_video)
+        log.info("Single segment, copied directly -> %s", silent_video.name)
+        return silent_video
+
+    # Multiple segments - use xfade filter for crossfades
+    durations = _segment_lengths(scene_files, profile)
+    mode = str(stitch_mode or STITCH_MODE).strip().lower()
+    if mode == 'boundary':
+        try:
+            sequence = _stitch_boundary(segment_files, scene_files, render_dir, profile, log)
+            _concat_copy(sequence, render_dir, silent_video, log)
+            log.info("Boundary crossfade OK -> %s", silent_video.name)
+            return silent_video
+        except Exception as e:
+            log.warning("Boundary stitch failed (%s), using grouped crossfades", e)
+
+    # Chain and fallback encode the whole video in one process: allow for slower-than-realtime
+    timeout = max(900, int(_xfade_duration(durations, _crossfade_seconds(profile)) * 4))
+    try:
+        if mode == 'chain' or len(segment_files) <= XFADE_GROUP_SIZE:
+            _xfade_files(segment_files, durations, silent_video, profile, timeout, 'xfade', log)
+        else:
+            _xfade_grouped(segment_files, durations, render_dir, silent_video, profile, log)
+    except Exception as e:
+        # Fallback to simple concat without transitions
+        log.warning("Crossfade failed (%s). Falling back to simple concat without transitions...", e)
+        if job_id:
+            _job_update(job_id, stitch_fallback=str(e)[:300])
+        # Non-final segments run one crossfade past their scene; cut that off
+        # so each scene still starts on its narration
+        fps, fk = profile['fps'], _boundary_frames(profile)
+        frames = [round(d * fps) - fk for d in durations[:-1]] + [round(durations[-1] * fps)]
+        _concat_trimmed(segment_files, frames, silent_video, profile, timeout, log)
+        log.info("Fallback concat OK -> %s", silent_video.name)
+    else:
+        log.info("Crossfade OK -> %s", silent_video.name)
+
+    return silent_video
+
+
+def _merge_audio(silent_video, audio_path, final_video, profile, log):
+    """Mux the narration onto the silent video (video stream copied)."""
+    log.info("Merging audio...")
+    merge_cmd = ['ffmpeg','-y','-i', str(silent_video), '-i', str(audio_path), '-c:v','copy','-c:a','aac','-b:a', profile['audio_bitrate'],'-shortest', str(final_video)]
+    log.info("FFmpeg merge cmd: %s", ' '.join(merge_cmd))
+    _run_ffmpeg(merge_cmd, 600, 'audio merge', log)
+    log.info("Audio merged: %s", Path(final_video).name)
+
+
+def _ass_filter_arg(ass_path):
+    # Note: ass filter requires escaping colons and backslashes in path on some systems
+    return "ass=" + str(ass_path).replace('\\', '/').replace(':', '\\:')
+
+
+def _burn_subtitles(video, word_timestamps, render_dir: Path, video_with_subs, profile, log):
+    """
+    Burn word-timestamp subtitles into video as a separate encode.
+
+    Returns the subtitled path, or the input video if subtitles could not be
+    generated or burned (the render continues without them).
+    """
+    log.info("Burning subtitles (%d word timestamps)...", len(word_timestamps))
+    ass_path = render_dir / 'subtitles.ass'
+    if not _generate_ass_subtitles(word_timestamps, str(ass_path), log=log):
+        return video
+
+    subs_cmd = [
+        'ffmpeg', '-y',
+        '-i', str(video),
+        '-vf', _ass_filter_arg(ass_path),
+        '-c:a', 'copy',
+        *_x264_args(profile),
+        str(video_with_subs)
+    ]
+    log.info("FFmpeg subtitle burn cmd: %s", ' '.join(subs_cmd))
+    try:
+        _run_ffmpeg(subs_cmd, 600, 'subtitle burn', log)
+    except Exception:
+        # Don't fail the render, just skip subtitles
+        log.warning("Continuing without subtitles")
+        return video
+
+    log.info("Subtitles burned successfully -> %s", Path(video_with_subs).name)
+    return video_with_subs
+
+
+def _render_single_pass(scene_files, audio_path, word_timestamps, render_dir: Path, final_video, profile, log,
+                        on_progress=None):
+    """
+    Render the whole video with one ffmpeg filter graph and a single H.264 encode.
+
+    Every scene is scaled/padded and normalised to the profile's fps, chained through the same
+    xfade offsets as the multi-step path, optionally run through ass=, and muxed
+    with the narration. Raises on failure so the caller can fall back.
+    on_progress(fraction) follows the encode from 0 to 1.
+    """
+    inputs = []
+    filter_parts = []
+    labels = []
+    lengths = _segment_lengths(scene_files, profile)
+    for i, sf in enumerate(scene_files):
+        duration = lengths[i]
+        if sf.get('is_video'):
+            inputs.extend(['-t', str(duration), '-i', sf['path']])
+            pad = f"tpad=stop_mode=clone:stop_duration={duration:.3f},"
+        else:
+            inputs.extend(['-loop', '1', '-t', str(duration), '-i', sf['path']])
+            pad = ''
+        filter_parts.append(
+            f"[{i}:v]{pad}{_scale_pad_filter(profile)},"
+            # fps last: xfade needs the frame rate that trim/setpts leave unset
+            f"setsar=1,format=yuv420p,trim=duration={duration},setpts=PTS-STARTPTS,fps={profile['fps']}[s{i}]"
+        )
+        labels.append(f"[s{i}]")
+
+    if len(labels) > 1:
+        xfade_parts, video_label = _xfade_filter_chain(labels, lengths, _crossfade_seconds(profile))
+        filter_parts.extend(xfade_parts)
+    else:
+        video_label = labels[0]
+
+    if word_timestamps:
+        ass_path = render_dir / 'subtitles.ass'
+        if _generate_ass_subtitles(word_timestamps, str(ass_path), log=log):
+            filter_parts.append(f"{video_label}{_ass_filter_arg(ass_path)}[vout]")
+            video_label = '[vout]'
+
+    audio_index = len(scene_files)
+    cmd = [
+        'ffmpeg', '-y',
+        *inputs,
+        '-i', str(audio_path),
+        '-filter_complex', ';'.join(filter_parts),
+        '-map', video_label,
+        '-map', f"{audio_index}:a",
+        *_x264_args(profile),
+        '-c:a', 'aac',
+        '-b:a', profile['audio_bitrate'],
+        '-shortest',
+        str(final_video)
+    ]
+    log.info("FFmpeg single-pass cmd: %s", ' '.join(cmd[:20]) + '...')
+    output_length = sum(lengths) - _crossfade_seconds(profile) * (len(lengths) - 1)
+    report = None
+    if on_progress:
+        def report(seconds):
+            on_progress(min(seconds / max(output_length, 1e-6), 1.0))
+    _run_ffmpeg(cmd, SINGLE_PASS_TIMEOUT, 'single-pass render', log, on_progress=report)
+    log.info("Single-pass render OK -> %s", Path(final_video).name)
+
+
+# =============================================================================
+# SUPABASE STORAGE UPLOAD
+# =============================================================================
+
+def _upload_progress(job_id, method, sent, total, started):
+    elapsed = max(time.time() - started, 1e-6)
+    _job_update(job_id, upload={
+        'method': method,
+        'bytes_sent': sent,
+        'total_bytes': total,
+        'throughput_mbps': round(sent * 8 / elapsed / 1e6, 2),
+    }, progress=90 + int((sent / max(total, 1)) * 9))
+
+
+def _upload_to_supabase_storage(supabase_url, service_role_key, bucket, storage_path, file_path, job_id, log):
+    """
+    Upload a file to Supabase storage without reading it into memory.
+
+    Uses the TUS resumable endpoint in UPLOAD_CHUNK_SIZE chunks, retrying each
+    chunk with exponential backoff and re-syncing the offset from the server.
+    Falls back to a single streamed POST if the resumable endpoint is
+    unavailable. Returns (status_code, response_text); 200/201 means success.
+    Throughput is reported as the job's upload field.
+    """
+    total = Path(file_path).stat().st_size
+    started = time.time()
+    auth = {'Authorization': f'Bearer {service_role_key}', 'x-upsert': 'true'}
+
+    def b64(value):
+        return base64.b64encode(value.encode('utf-8')).decode('ascii')
+
+    tus_headers = {**auth, 'Tus-Resumable': '1.0.0'}
+    try:
+        create = requests.post(
+            f"{supabase_url}/storage/v1/upload/resumable",
+            headers={
+                **tus_headers,
+                'Upload-Length': str(total),
+                'Upload-Metadata': ','.join([
+                    f"bucketName {b64(bucket)}",
+                    f"objectName {b64(storage_path)}",
+                    f"contentType {b64('video/mp4')}",
+                ]),
+            },
+            timeout=60,
+        )
+    except requests.RequestException as e:
+        create = None
+        log.warning("TUS upload creation failed: %s", e)
+
+    if create is None or create.status_code != 201 or not create.headers.get('Location'):
+        if create is not None:
+            log.warning("TUS upload unavailable (%d %s), using streamed POST", create.status_code, (create.text or '')[:200])
+        with open(file_path, 'rb') as f:
+            up = requests.post(
+                f"{supabase_url}/storage/v1/object/{bucket}/{storage_path}",
+                headers={**auth, 'Content-Type': 'video/mp4', 'Content-Length': str(total)},
+                data=f,
+                timeout=1200,
+            )
+        if up.status_code in (200, 201):
+            _upload_progress(job_id, 'stream', total, total, started)
+            _record_transfer('upload', total, time.time() - started)
+        return up.status_code, up.text or ''
+
+    upload_url = urljoin(f"{supabase_url}/storage/v1/upload/resumable", create.headers['Location'])
+    log.info("TUS upload created: %s", upload_url)
+    offset = 0
+    _upload_progress(job_id, 'tus', offset, total, started)
+    with open(file_path, 'rb') as f:
+        while offset < total:
+            f.seek(offset)
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            for attempt in range(UPLOAD_CHUNK_RETRIES + 1):
+                try:
+                    resp = requests.patch(
+                        upload_url,
+                        headers={
+                            **tus_headers,
+                            'Upload-Offset': str(offset),
+                            'Content-Type': 'application/offset+octet-stream',
+                        },
+                        data=chunk,
+                        timeout=300,
+                    )
+                    if resp.status_code == 204:
+                        offset = int(resp.headers.get('Upload-Offset', offset + len(chunk)))
+                        break
+                    error = f"{resp.status_code}: {(resp.text or '')[:300]}"
+                    if resp.status_code < 500 and resp.status_code not in (409, 423, 429):
+                        return resp.status_code, resp.text or ''
+                except requests.RequestException as e:
+                    error = str(e)
+
+                if attempt == UPLOAD_CHUNK_RETRIES:
+                    return 599, f"TUS chunk at offset {offset} failed after {attempt + 1} attempts: {error}"
+                delay = min(2 ** attempt, 30)
+                log.warning("TUS chunk at offset %d failed (%s), retrying in %ds", offset, error, delay)
+                time.sleep(delay)
+                # The server may have stored part of the chunk; resume from its offset
+                try:
+                    head = requests.head(upload_url, headers=tus_headers, timeout=30)
+                    if head.status_code in (200, 204) and head.headers.get('Upload-Offset'):
+                        server_offset = int(head.headers['Upload-Offset'])
+                        if server_offset != offset:
+                            offset = server_offset
+                            break
+                except requests.RequestException:
+                    pass
+            _upload_progress(job_id, 'tus', offset, total, started)
+
+    log.info("TUS upload complete: %d bytes at %.2f Mbps", total, _job_get(job_id)['upload']['throughput_mbps'])
+    _record_transfer('upload', total, time.time() - started)
+    return 200, ''
+
+
+# =============================================================================
+# LOVABLE RENDER JOB + QUEUE
+# =============================================================================
+
+def _do_lovable_render(job_id, payload):
+    """Run one Lovable render job end to end (download -> render -> upload)."""
+    project_id = payload.get('project_id')
+    render_id = payload.get('render_id')
+    scenes = payload.get('scenes') or []
+    audio_url = payload.get('audio_url')
+    word_timestamps = payload.get('word_timestamps') or []
+    supabase_url = payload.get('supabase_url')
+    sealed_key = payload.get('supabase_key_sealed')
+    supabase_key = _open_secret(sealed_key) if sealed_key else None
+    render_mode = str(payload.get('render_mode') or LOVABLE_RENDER_MODE).strip().lower()
+    profile_name = str(payload.get('profile') or DEFAULT_RENDER_PROFILE).strip().lower()
+    if profile_name not in RENDER_PROFILES:
+        profile_name = 'standard'
+    profile = RENDER_PROFILES[profile_name]
+    incremental = payload.get('incremental', True) is not False
+    stitch_mode = str(payload.get('stitch_mode') or STITCH_MODE).strip().lower()
+    boundary_keyframes = stitch_mode == 'boundary'
+
+    render_dir = None
+    timings = {}
+    log = logging.getLogger(f'yve-render.{job_id[:8]}')
+    log.info("=== RENDER THREAD STARTED === job=%s project=%s render=%s", job_id, project_id, render_id)
+    log.info("audio_url=%s  scenes=%d", audio_url, len(scenes))
+    # Resolve Supabase credentials early so exception handlers can use them
+    _sb_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or supabase_key
+    try:
+        _job_update(job_id, status='rendering', message='Preparing...', profile=profile_name)
+        if supabase_url and not _sb_key:
+            if sealed_key:
+                raise Exception("Supabase key unavailable: SUPABASE_SERVICE_ROLE_KEY is not set and the "
+                                "client key was sealed by an earlier server start; re-submit the render")
+            raise Exception("Supabase key missing: set SUPABASE_SERVICE_ROLE_KEY or send supabase_key")
+
+        render_dir = LOVABLE_TEMP_DIR / f"lovable_{job_id}"
+        render_dir.mkdir(parents=True, exist_ok=True)
+        log.info("Render dir: %s", render_dir)
+
+        # Download audio
+        _job_update(job_id, message='Downloading audio...')
+        log.info("Downloading audio from %s", audio_url)
+        audio_path = render_dir / 'audio.mp3'
+        with _job_stage(job_id, timings, 'download'):
+            audio_size, _ = _download_to_file(audio_url, audio_path, timeout=300,
+                                              ref=f"render:{render_dir.name}/{audio_path.name}")
+        log.info("Audio downloaded: %d bytes", audio_size)
+
+        # Download images and videos (bounded concurrency, per-host limits)
+        scene_files = _plan_scene_files(scenes, render_dir, log)
+        segment_subtitles = False
+        if word_timestamps and render_mode != 'single_pass':
+            # Sliced before reuse matching: a segment's subtitles are part of its signature
+            segment_subtitles = _plan_segment_subtitles(scene_files, word_timestamps, profile, log)
+        _job_update(job_id, message='Downloading media...')
+        with _job_stage(job_id, timings, 'download'):
+            _download_scene_assets(scene_files, job_id, log)
+        if incremental and render_mode != 'single_pass' and scene_files:
+            # Segments of scenes whose content is unchanged since the last render
+            _job_update(job_id, segments_reusable=_mark_reusable_scenes(
+                project_id, profile_name, scene_files, log, boundary_keyframes))
+
+        if not scene_files:
+            raise Exception('No valid scenes with image_url or video_url')
+
+        log.info("All assets downloaded. %d scene files ready.", len(scene_files))
+
+        final_video = render_dir / f"{project_id}_{render_id}.mp4"
+        rendered_single_pass = False
+        if render_mode == 'single_pass':
+            # One ffmpeg graph: scale + crossfades + subtitles + audio, encoded once
+            _job_update(job_id, message='Rendering video (single pass)...', progress=20)
+            try:
+                last_progress = [20]
+
+                def single_pass_progress(fraction):
+                    # The one encode covers everything up to the upload at 90
+                    progress = 20 + int(fraction * 69)
+                    if progress != last_progress[0]:
+                        last_progress[0] = progress
+                        _job_update(job_id, progress=progress)
+
+                with _job_stage(job_id, timings, 'single_pass'):
+                    _render_single_pass(scene_files, audio_path, word_timestamps, render_dir, final_video, profile, log,
+                                        on_progress=single_pass_progress)
+                rendered_single_pass = True
+            except Exception as e:
+                log.warning("Single-pass render failed, falling back to multi-step pipeline: %s", e)
+                _job_update(job_id, render_fallback=str(e)[:300])
+        _job_update(job_id, render_mode='single_pass' if rendered_single_pass else 'multi_step')
+
+        if not rendered_single_pass:
+            if word_timestamps and render_mode == 'single_pass':
+                segment_subtitles = _plan_segment_subtitles(scene_files, word_timestamps, profile, log)
+
+            # Render segments (each burns its own slice of the subtitles)
+            _job_update(job_id, message='Rendering video segments...')
+            with _job_stage(job_id, timings, 'segment_encode'):
+                segment_files = _render_segments(scene_files, render_dir, job_id, profile, log,
+                                                 boundary_keyframes=boundary_keyframes)
+            if segment_subtitles and any(sf.get('subtitles_burned') is False for sf in scene_files):
+                # Mixed segments would double-burn; redo the subtitled ones plain and burn at the end
+                log.warning("Per-segment subtitles failed, re-encoding segments without them")
+                for sf in scene_files:
+                    sf.pop('subtitles', None)
+                    sf.pop('reuse_key', None)
+                # Drop the subtitled segments (cache links) so the plain pass writes new files
+                for segment in segment_files:
+                    Path(segment).unlink(missing_ok=True)
+                with _job_stage(job_id, timings, 'segment_encode'):
+                    segment_files = _render_segments(scene_files, render_dir, job_id, profile, log,
+                                                     boundary_keyframes=boundary_keyframes)
+                segment_subtitles = False
+
+            # Concatenate with crossfade transitions
+            _job_update(job_id, message='Adding transitions...')
+            with _job_stage(job_id, timings, 'xfade'):
+                silent_video = _stitch_segments(segment_files, scene_files, render_dir, profile, log,
+                                                stitch_mode=stitch_mode, job_id=job_id)
+            _job_update(job_id, progress=75)
+
+            # Add audio
+            _job_update(job_id, message='Adding audio...')
+            with _job_stage(job_id, timings, 'merge_audio'):
+                _merge_audio(silent_video, audio_path, final_video, profile, log)
+            _job_update(job_id, progress=82)
+
+            # Burn subtitles if word timestamps are available and the segments don't carry them
+            if segment_subtitles:
+                log.info("Subtitles burned per segment, skipping separate subtitle encode")
+            elif word_timestamps and len(word_timestamps) > 0:
+                _job_update(job_id, message='Adding subtitles...')
+                with _job_stage(job_id, timings, 'subtitle_burn'):
+                    final_video = _burn_subtitles(
+                        final_video, word_timestamps, render_dir,
+                        render_dir / f"{project_id}_{render_id}_subs.mp4", profile, log
+                    )
+            else:
+                log.info("No word timestamps, skipping subtitle generation")
+
+            try:
+                _save_render_manifest(project_id, render_id, profile_name, scene_files, boundary_keyframes)
+            except Exception as e:
+                log.warning("Could not save render manifest: %s", e)
+
+        _job_update(job_id, progress=90)
+
+        final_size = final_video.stat().st_size
+        log.info("Final video: %s (%.1f MB)", final_video.name, final_size / (1024 * 1024))
+
+        # Always save a local backup first
+        backup_dir = OUTPUT_DIR / str(project_id)
+        backup_dir.mkdir(parents=True, exist_ok=True)
+        backup_path = backup_dir / f"{render_id}.mp4"
+        shutil.copy2(final_video, backup_path)
+        log.info("Local backup saved -> %s", backup_path)
+        _job_update(job_id, local_path=str(backup_path))
+
+        # Upload to Supabase (use service role key from env, not client-provided anon key)
+        _job_update(job_id, message='Uploading...')
+        service_role_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or supabase_key
+        if supabase_url and service_role_key:
+            if os.environ.get('SUPABASE_SERVICE_ROLE_KEY'):
+                log.info("Using SUPABASE_SERVICE_ROLE_KEY from environment")
+            else:
+                log.warning("SUPABASE_SERVICE_ROLE_KEY not set, falling back to client-provided key (may lack permissions)")
+
+            storage_path = f"{project_id}/{render_id}.mp4"
+            log.info("Uploading to Supabase: %s (%.1f MB)", storage_path, final_size / (1024 * 1024))
+
+            with _job_stage(job_id, timings, 'upload'):
+                up_status, up_text = _upload_to_supabase_storage(
+                    supabase_url, service_role_key, 'renders', storage_path, final_video,
+                    job_id, log
+                )
+
+            if up_status not in (200, 201):
+                log.error("Supabase upload failed: %d %s (video preserved at %s)", up_status, up_text[:500], backup_path)
+                # Use VPS video endpoint so the frontend can reach the video
+                _job_update(job_id, video_url=f"http://31.97.147.132:5001/api/video/{project_id}/{render_id}",
+                                    upload_error=f"{up_status}: {up_text[:300]}")
+                # Don't raise — video is saved locally, mark as completed with warning
+            else:
+                public_url = f"{supabase_url}/storage/v1/object/public/renders/{storage_path}"
+                _job_update(job_id, video_url=public_url)
+                log.info("Upload OK -> %s", public_url)
+        else:
+            # No Supabase credentials — use VPS video endpoint for local serving
+            _job_update(job_id, video_url=f"http://31.97.147.132:5001/api/video/{project_id}/{render_id}")
+            log.info("No Supabase credentials, using VPS video endpoint")
+
+        _job_update(job_id, status='completed', progress=100, message='Render complete')
+        log.info("=== RENDER COMPLETE === job=%s timings=%s", job_id, timings)
+
+        # --- Update Supabase renders table directly ---
+        _update_render_in_supabase(
+            supabase_url, _sb_key, render_id,
+            status='completed',
+            video_url=_job_get(job_id).get('video_url'),
+            log=log
+        )
+
+    except subprocess.TimeoutExpired as e:
+        msg = f"FFmpeg timed out after {e.timeout}s"
+        log.error("=== RENDER TIMEOUT === job=%s: %s", job_id, msg)
+        _job_update(job_id, status='failed', error=msg, message=msg)
+        _update_render_in_supabase(
+            supabase_url, _sb_key, render_id,
+            status='failed', error_message=msg, log=log
+        )
+    except Exception as e:
+        tb = traceback.format_exc()
+        log.error("=== RENDER FAILED === job=%s\n%s", job_id, tb)
+        _job_update(job_id, status='failed', error=str(e), message=f"Error: {e}")
+        _update_render_in_supabase(
+            supabase_url, _sb_key, render_id,
+            status='failed', error_message=str(e), log=log
+        )
+    finally:
+        if render_dir:
+            # Links in a kept render dir stay valid without the blob references
+            _blob_release(f"render:{render_dir.name}/", prefix=True)
+            _blob_gc_soon()
+        # Only clean up temp dir if render completed successfully
+        if _job_get(job_id).get('status') == 'completed' and render_dir:
+            shutil.rmtree(render_dir, ignore_errors=True)
+            log.info("Cleaned up render dir for job=%s", job_id)
+        elif render_dir:
+            log.info("Keeping render dir for failed job=%s: %s", job_id, render_dir)
+
+
+_render_queue_cv = threading.Condition()
+_render_queue_started = False
+
+# Only one process runs render jobs: the holder of an flock on this file.
+# Other worker processes stand by and take over if the holder exits.
+RENDER_QUEUE_LOCK_FILE = STATE_DB.with_name(STATE_DB.name + '.queue.lock')
+RENDER_QUEUE_STANDBY_INTERVAL = 10
+# Jobs enqueued by another process are only noticed by polling
+RENDER_QUEUE_POLL = 2
+_render_queue_lock = None
+
+
+def _seal_secret(text):
+    """
+    Encrypt-then-MAC text under SERVER_SECRET for storage in the state DB.
+
+    Only processes of the same server start can open it (_open_secret), so a
+    copy of the DB does not leak it and a restart makes it unrecoverable.
+    """
+    data = text.encode('utf-8')
+    nonce = os.urandom(16)
+    stream = hashlib.shake_256(b'seal-stream' + SERVER_SECRET + nonce).digest(len(data))
+    sealed = nonce + bytes(a ^ b for a, b in zip(data, stream))
+    tag = hmac.new(SERVER_SECRET, b'seal-mac' + sealed, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(tag + sealed).decode('ascii')
+
+
+def _open_secret(token):
+    """Plaintext of a _seal_secret token, or None if it was sealed by another server start."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii'))
+    except Exception:
+        return None
+    tag, sealed = raw[:32], raw[32:]
+    if len(sealed) < 16 or not hmac.compare_digest(
+            tag, hmac.new(SERVER_SECRET, b'seal-mac' + sealed, hashlib.sha256).digest()):
+        return None
+    nonce, data = sealed[:16], sealed[16:]
+    stream = hashlib.shake_256(b'seal-stream' + SERVER_SECRET + nonce).digest(len(data))
+    return bytes(a ^ b for a, b in zip(data, stream)).decode('utf-8')
+
+
+def _enqueue_render_job(job_id, payload):
+    """
+    Persist a render job and wake a queue worker. Higher payload 'priority' runs first.
+
+    The client's supabase_key is only persisted sealed (supabase_key_sealed),
+    for whichever process runs the job; SUPABASE_SERVICE_ROLE_KEY takes
+    precedence over it at run time.
+    """
+    payload = dict(payload)
+    client_key = payload.pop('supabase_key', None)
+    if client_key:
+        payload['supabase_key_sealed'] = _seal_secret(str(client_key))
+    try:
+        priority = int(payload.get('priority') or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    _state_db().execute(
+        "INSERT INTO render_queue (job_id, priority, enqueued_at, state, payload) VALUES (?, ?, ?, 'queued', ?)",
+        (job_id, priority, time.time(), json.dumps(payload)),
+    )
+    _refresh_queue_positions()
+    with _render_queue_cv:
+        _render_queue_cv.notify()
+
+
+def _claim_render_job():
+    """Atomically mark the next queued job as running. Returns (job_id, payload) or None."""
+    conn = _state_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT job_id, payload FROM render_queue WHERE state = 'queued'"
+            " ORDER BY priority DESC, enqueued_at, rowid LIMIT 1"
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE render_queue SET state = 'running' WHERE job_id = ?", (row['job_id'],))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return (row['job_id'], json.loads(row['payload'])) if row else None
+
+
+def _refresh_queue_positions():
+    """
+    Store each waiting job's 1-based queue_position in its job state.
+
+    Called whenever the queue order changes (enqueue, claim, restore), so
+    status polls read the position from the job cache instead of the DB.
+    """
+    rows = _state_db().execute(
+        "SELECT job_id FROM render_queue WHERE state = 'queued' ORDER BY priority DESC, enqueued_at, rowid"
+    ).fetchall()
+    for position, row in enumerate(rows, start=1):
+        job = _job_get(row['job_id'])
+        if job is not None and job.get('queue_position') != position:
+            _job_update(row['job_id'], queue_position=position)
+
+
+def _render_queue_worker():
+    while True:
+        try:
+            claimed = _claim_render_job()
+        except Exception as e:
+            logger.error("Render queue claim failed: %s", e)
+            claimed = None
+        if not claimed:
+            with _render_queue_cv:
+                _render_queue_cv.wait(timeout=RENDER_QUEUE_POLL)
+            continue
+
+        job_id, payload = claimed
+        _job_update(job_id, queue_position=None)
+        try:
+            _refresh_queue_positions()
+        except Exception as e:
+            logger.warning("Could not update queue positions: %s", e)
+        try:
+            _do_lovable_render(job_id, payload)
+        except Exception:
+            logger.error("Render job %s crashed:\n%s", job_id, traceback.format_exc())
+        finally:
+            _state_db().execute("DELETE FROM render_queue WHERE job_id = ?", (job_id,))
+
+
+def _acquire_render_queue_lock():
+    """Try (without blocking) to become the process that runs the render queue."""
+    global _render_queue_lock
+    if fcntl is None:
+        return True
+    f = open(RENDER_QUEUE_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.truncate(0)
+    f.write(f"{os.getpid()}\n")
+    f.flush()
+    _render_queue_lock = f  # held until this process exits
+    return True
+
+
+def _render_queue_standby():
+    while not _acquire_render_queue_lock():
+        time.sleep(RENDER_QUEUE_STANDBY_INTERVAL)
+    logger.info("Took over the render queue (pid %d)", os.getpid())
+    _run_render_queue()
+
+
+def _start_render_queue():
+    """Run the render queue in this process, or stand by while another process runs it."""
+    global _render_queue_started
+    if _render_queue_started:
+        return
+    _render_queue_started = True
+
+    if _acquire_render_queue_lock():
+        _run_render_queue()
+    else:
+        logger.info("Render queue is run by another process; standing by")
+        threading.Thread(target=_render_queue_standby, name='render-queue-standby', daemon=True).start()
+
+
+def _run_render_queue():
+    """Start RENDER_QUEUE_WORKERS workers; re-queue jobs left running by a dead leader."""
+    conn = _state_db()
+    conn.execute("UPDATE render_queue SET state = 'queued' WHERE state = 'running'")
+    for row in conn.execute("SELECT job_id FROM render_queue ORDER BY priority DESC, enqueued_at, rowid"):
+        if _job_get(row['job_id']) is None:
+            _job_create(row['job_id'], {'progress': 0, 'video_url': None, 'error': None})
+        _job_update(row['job_id'], status='queued', message='Queued for rendering (restored after restart)')
+    _refresh_queue_positions()
+
+    for n in range(max(1, RENDER_QUEUE_WORKERS)):
+        threading.Thread(target=_render_queue_worker, name=f"render-worker-{n}", daemon=True).start()
+    logger.info("Render queue started with %d worker(s)", max(1, RENDER_QUEUE_WORKERS))
+
+
 # =============================================================================
 # LOVABLE RENDER ENDPOINTS (ADD-ON)
 # =============================================================================
 
+# EventSource cannot send headers, so job streams take ?token= with a per-job
+# token from the render/status responses instead of the API key (which would
+# end up in access logs). Valid for STREAM_TOKEN_TTL seconds after issue.
+STREAM_TOKEN_TTL = int(os.environ.get('YVE_STREAM_TOKEN_TTL', '3600'))
+
+
+def _stream_token(job_id, expires=None):
+    """'<expiry>.<HMAC of job_id and expiry>', signed with the API key."""
+    expires = int(expires or time.time() + STREAM_TOKEN_TTL)
+    sig = hmac.new(VPS_API_KEY.encode('utf-8'), f"stream:{job_id}:{expires}".encode('utf-8'),
+                   hashlib.sha256).hexdigest()
+    return f"{expires}.{sig}"
+
+
+def _stream_token_valid(job_id, token):
+    expires, _, sig = (token or '').partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(_stream_token(job_id, int(expires)), f"{expires}.{sig}")
+
+
 @app.route('/api/lovable-render', methods=['POST', 'OPTIONS'])
 def lovable_render():
     """Start a render job (Lovable Cloud -> your VPS)."""
-    global lovable_render_jobs
-
     # CORS preflight
     if request.method == 'OPTIONS':
         resp = jsonify({'status': 'ok'})
@@ -1343,409 +4410,31 @@ def lovable_render():
     render_id = data.get('render_id')
     scenes = data.get('scenes') or []
     audio_url = data.get('audio_url')
-    word_timestamps = data.get('word_timestamps') or []
-    supabase_url = data.get('supabase_url')
-    supabase_key = data.get('supabase_key')
 
     if not project_id or not render_id or not audio_url or not isinstance(scenes, list) or len(scenes) == 0:
         return jsonify({'success': False, 'error': 'Missing required fields'}), 400
 
+    if data.get('profile') and str(data['profile']).strip().lower() not in RENDER_PROFILES:
+        return jsonify({'success': False, 'error': f"Unknown profile. Use one of: {', '.join(RENDER_PROFILES)}"}), 400
+
+    if data.get('render_mode') and str(data['render_mode']).strip().lower() not in RENDER_MODES:
+        return jsonify({'success': False, 'error': f"Unknown render_mode. Use one of: {', '.join(RENDER_MODES)}"}), 400
+
     job_id = str(uuid.uuid4())
-    lovable_render_jobs[job_id] = {
+    _job_create(job_id, {
         'status': 'queued',
         'progress': 0,
         'message': 'Queued for rendering',
         'video_url': None,
         'error': None,
-    }
-
-    def do_render():
-        render_dir = None
-        log = logging.getLogger(f'yve-render.{job_id[:8]}')
-        log.info("=== RENDER THREAD STARTED === job=%s project=%s render=%s", job_id, project_id, render_id)
-        log.info("audio_url=%s  scenes=%d", audio_url, len(scenes))
-        # Resolve Supabase credentials early so exception handlers can use them
-        _sb_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or supabase_key
-        try:
-            lovable_render_jobs[job_id]['status'] = 'rendering'
-            lovable_render_jobs[job_id]['message'] = 'Preparing...'
-
-            render_dir = LOVABLE_TEMP_DIR / f"lovable_{job_id}"
-            render_dir.mkdir(parents=True, exist_ok=True)
-            log.info("Render dir: %s", render_dir)
-
-            # Download audio
-            lovable_render_jobs[job_id]['message'] = 'Downloading audio...'
-            log.info("Downloading audio from %s", audio_url)
-            audio_path = render_dir / 'audio.mp3'
-            audio_resp = requests.get(audio_url, timeout=300)
-            audio_resp.raise_for_status()
-            audio_path.write_bytes(audio_resp.content)
-            log.info("Audio downloaded: %d bytes", len(audio_resp.content))
-
-            # Download images and videos
-            lovable_render_jobs[job_id]['message'] = 'Downloading media...'
-            scene_files = []
-            for i, scene in enumerate(scenes):
-                video_url = scene.get('video_url')
-                img_url = scene.get('image_url')
-                scene_duration = float(scene.get('duration', 10) or 10)
-
-                if video_url:
-                    # Download video file
-                    vid_path = render_dir / f"scene_{i:03d}_video.mp4"
-                    log.info("Downloading scene %d video: %s", i, video_url[:120])
-                    r = requests.get(video_url, timeout=300)
-                    r.raise_for_status()
-                    vid_path.write_bytes(r.content)
-                    log.info("Scene %d video: %d bytes -> %s", i, len(r.content), vid_path.name)
-
-                    scene_files.append({
-                        'path': str(vid_path),
-                        'duration': scene_duration,
-                        'is_video': True,
-                    })
-                elif img_url:
-                    # Download image file
-                    img_path = render_dir / f"scene_{i:03d}.png"
-                    log.info("Downloading scene %d image: %s", i, img_url[:120])
-                    r = requests.get(img_url, timeout=120)
-                    r.raise_for_status()
-                    img_path.write_bytes(r.content)
-                    log.info("Scene %d image: %d bytes -> %s", i, len(r.content), img_path.name)
-
-                    scene_files.append({
-                        'path': str(img_path),
-                        'duration': scene_duration,
-                        'is_video': False,
-                    })
-                else:
-                    log.warning("Scene %d has no image_url or video_url, skipping", i)
-                    continue
-
-                lovable_render_jobs[job_id]['progress'] = int(((i + 1) / max(len(scenes), 1)) * 20)
-
-            if not scene_files:
-                raise Exception('No valid scenes with image_url or video_url')
-
-            log.info("All assets downloaded. %d scene files ready.", len(scene_files))
-
-            # Render segments
-            lovable_render_jobs[job_id]['message'] = 'Rendering video segments...'
-            segment_files = []
-            for i, sf in enumerate(scene_files):
-                duration = max(0.5, float(sf['duration']))
-                segment_path = render_dir / f"segment_{i:03d}.mp4"
-
-                if sf.get('is_video'):
-                    # Video scene: trim to duration, scale to 1920x1080
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-i', sf['path'],
-                        '-t', str(duration),
-                        '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2',
-                        '-r', '25',
-                        '-c:v', 'libx264',
-                        '-pix_fmt', 'yuv420p',
-                        '-preset', 'fast',
-                        '-an',
-                        str(segment_path)
-                    ]
-                else:
-                    # Image scene: static image -> video with loop
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-loop', '1',
-                        '-i', sf['path'],
-                        '-t', str(duration),
-                        '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2',
-                        '-r', '25',
-                        '-c:v', 'libx264',
-                        '-pix_fmt', 'yuv420p',
-                        '-preset', 'fast',
-                        '-an',
-                        str(segment_path)
-                    ]
-
-                media_type = 'video' if sf.get('is_video') else 'image'
-                log.info("FFmpeg segment %d/%d (%s) cmd: %s", i + 1, len(scene_files), media_type, ' '.join(cmd))
-                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
-                try:
-                    stdout, stderr = proc.communicate(timeout=300)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    proc.communicate()  # drain pipes after kill
-                    log.error("FFmpeg segment %d TIMED OUT after 300s, killed", i)
-                    raise Exception(f"FFmpeg segment {i} timed out after 300s")
-
-                if proc.returncode != 0:
-                    stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                    log.error("FFmpeg segment %d FAILED (rc=%d)\nSTDERR:\n%s", i, proc.returncode, stderr_text[-3000:])
-                    raise Exception(f"FFmpeg segment {i} failed (rc={proc.returncode}): {stderr_text[-2000:]}")
-
-                stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                log.info("FFmpeg segment %d/%d OK -> %s (stderr=%d bytes)", i + 1, len(scene_files), segment_path.name, len(stderr_text))
-
-                segment_files.append(str(segment_path))
-                lovable_render_jobs[job_id]['progress'] = 20 + int(((i + 1) / len(scene_files)) * 50)
-                lovable_render_jobs[job_id]['message'] = f"Rendered segment {i+1}/{len(scene_files)}"
-
-            # Concatenate with crossfade transitions
-            log.info("Concatenating %d segments with crossfade transitions...", len(segment_files))
-            lovable_render_jobs[job_id]['message'] = 'Adding transitions...'
-
-            silent_video = render_dir / 'silent.mp4'
-            fade_duration = 0.5  # Crossfade duration in seconds
-
-            if len(segment_files) == 1:
-                # Single segment - just copy it
-                shutil.copy2(segment_files[0], silent_video)
-                log.info("Single segment, copied directly -> %s", silent_video.name)
-            else:
-                # Multiple segments - use xfade filter for crossfades
-                # Build input arguments
-                inputs = []
-                for seg in segment_files:
-                    inputs.extend(['-i', seg])
-
-                # Build xfade filter chain
-                # Each xfade needs: offset = cumulative_duration - fade_duration
-                filter_parts = []
-                cumulative_duration = 0
-
-                for i in range(len(scene_files) - 1):
-                    seg_duration = max(0.5, float(scene_files[i]['duration']))
-                    cumulative_duration += seg_duration
-
-                    # Offset is when the fade starts (subtract fade_duration)
-                    offset = cumulative_duration - fade_duration
-
-                    if i == 0:
-                        # First transition: [0:v][1:v]xfade...
-                        filter_parts.append(
-                            f"[0:v][1:v]xfade=transition=fade:duration={fade_duration}:offset={offset:.2f}[v{i+1}]"
-                        )
-                    else:
-                        # Subsequent transitions: [vN][N+1:v]xfade...
-                        filter_parts.append(
-                            f"[v{i}][{i+1}:v]xfade=transition=fade:duration={fade_duration}:offset={offset:.2f}[v{i+1}]"
-                        )
-
-                filter_complex = ';'.join(filter_parts)
-                final_label = f"[v{len(scene_files)-1}]"
-
-                xfade_cmd = [
-                    'ffmpeg', '-y',
-                    *inputs,
-                    '-filter_complex', filter_complex,
-                    '-map', final_label,
-                    '-c:v', 'libx264',
-                    '-pix_fmt', 'yuv420p',
-                    '-preset', 'fast',
-                    '-an',
-                    str(silent_video)
-                ]
-
-                log.info("FFmpeg xfade cmd: %s", ' '.join(xfade_cmd[:20]) + '...')
-                proc = subprocess.Popen(xfade_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
-                try:
-                    stdout, stderr = proc.communicate(timeout=900)  # Longer timeout for complex filter
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    proc.communicate()
-                    log.error("FFmpeg xfade TIMED OUT after 900s, killed")
-                    raise Exception("FFmpeg xfade timed out after 900s")
-
-                if proc.returncode != 0:
-                    stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                    log.error("FFmpeg xfade FAILED (rc=%d)\nSTDERR:\n%s", proc.returncode, stderr_text[-3000:])
-
-                    # Fallback to simple concat without transitions
-                    log.warning("Falling back to simple concat without transitions...")
-                    concat_list = render_dir / 'concat.txt'
-                    with open(concat_list, 'w', encoding='utf-8') as f:
-                        for seg in segment_files:
-                            f.write(f"file '{seg}'\n")
-
-                    concat_cmd = ['ffmpeg','-y','-f','concat','-safe','0','-i', str(concat_list), '-c','copy', str(silent_video)]
-                    proc = subprocess.Popen(concat_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
-                    stdout, stderr = proc.communicate(timeout=600)
-                    if proc.returncode != 0:
-                        stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                        raise Exception(f"FFmpeg concat fallback failed: {stderr_text[-2000:]}")
-                    log.info("Fallback concat OK -> %s", silent_video.name)
-                else:
-                    log.info("Crossfade OK -> %s", silent_video.name)
-
-            lovable_render_jobs[job_id]['progress'] = 75
-
-            # Add audio
-            log.info("Merging audio...")
-            lovable_render_jobs[job_id]['message'] = 'Adding audio...'
-            final_video = render_dir / f"{project_id}_{render_id}.mp4"
-            merge_cmd = ['ffmpeg','-y','-i', str(silent_video), '-i', str(audio_path), '-c:v','copy','-c:a','aac','-b:a','192k','-shortest', str(final_video)]
-            log.info("FFmpeg merge cmd: %s", ' '.join(merge_cmd))
-            proc = subprocess.Popen(merge_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
-            try:
-                stdout, stderr = proc.communicate(timeout=600)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                proc.communicate()
-                log.error("FFmpeg merge TIMED OUT after 600s, killed")
-                raise Exception("FFmpeg audio merge timed out after 600s")
-            if proc.returncode != 0:
-                stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                log.error("FFmpeg merge FAILED (rc=%d)\nSTDERR:\n%s", proc.returncode, stderr_text[-3000:])
-                raise Exception(f"FFmpeg audio merge failed (rc={proc.returncode}): {stderr_text[-2000:]}")
-
-            log.info("Audio merged: %s", final_video.name)
-
-            lovable_render_jobs[job_id]['progress'] = 82
-
-            # Burn subtitles if word timestamps are available
-            if word_timestamps and len(word_timestamps) > 0:
-                log.info("Burning subtitles (%d word timestamps)...", len(word_timestamps))
-                lovable_render_jobs[job_id]['message'] = 'Adding subtitles...'
-
-                ass_path = render_dir / 'subtitles.ass'
-                if _generate_ass_subtitles(word_timestamps, str(ass_path), log=log):
-                    # Burn subtitles into video
-                    video_with_subs = render_dir / f"{project_id}_{render_id}_subs.mp4"
-                    # Note: ass filter requires escaping colons and backslashes in path on some systems
-                    ass_path_escaped = str(ass_path).replace('\\', '/').replace(':', '\\:')
-                    subs_cmd = [
-                        'ffmpeg', '-y',
-                        '-i', str(final_video),
-                        '-vf', f"ass={ass_path_escaped}",
-                        '-c:a', 'copy',
-                        '-c:v', 'libx264',
-                        '-preset', 'fast',
-                        '-crf', '23',
-                        str(video_with_subs)
-                    ]
-                    log.info("FFmpeg subtitle burn cmd: %s", ' '.join(subs_cmd))
-                    proc = subprocess.Popen(subs_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
-                    try:
-                        stdout, stderr = proc.communicate(timeout=600)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                        proc.communicate()
-                        log.error("FFmpeg subtitle burn TIMED OUT after 600s, killed")
-                        # Don't fail the render, just skip subtitles
-                        log.warning("Continuing without subtitles")
-                    else:
-                        if proc.returncode != 0:
-                            stderr_text = stderr.decode('utf-8', errors='replace') if stderr else ''
-                            log.error("FFmpeg subtitle burn FAILED (rc=%d)\nSTDERR:\n%s", proc.returncode, stderr_text[-2000:])
-                            log.warning("Continuing without subtitles")
-                        else:
-                            # Replace final_video with the subtitled version
-                            final_video = video_with_subs
-                            log.info("Subtitles burned successfully -> %s", video_with_subs.name)
-            else:
-                log.info("No word timestamps, skipping subtitle generation")
-
-            lovable_render_jobs[job_id]['progress'] = 90
-
-            final_size = final_video.stat().st_size
-            log.info("Final video: %s (%.1f MB)", final_video.name, final_size / (1024 * 1024))
-
-            # Always save a local backup first
-            backup_dir = OUTPUT_DIR / str(project_id)
-            backup_dir.mkdir(parents=True, exist_ok=True)
-            backup_path = backup_dir / f"{render_id}.mp4"
-            shutil.copy2(final_video, backup_path)
-            log.info("Local backup saved -> %s", backup_path)
-            lovable_render_jobs[job_id]['local_path'] = str(backup_path)
-
-            # Upload to Supabase (use service role key from env, not client-provided anon key)
-            lovable_render_jobs[job_id]['message'] = 'Uploading...'
-            service_role_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or supabase_key
-            if supabase_url and service_role_key:
-                if os.environ.get('SUPABASE_SERVICE_ROLE_KEY'):
-                    log.info("Using SUPABASE_SERVICE_ROLE_KEY from environment")
-                else:
-                    log.warning("SUPABASE_SERVICE_ROLE_KEY not set, falling back to client-provided key (may lack permissions)")
-
-                storage_path = f"{project_id}/{render_id}.mp4"
-                upload_url = f"{supabase_url}/storage/v1/object/renders/{storage_path}"
-                log.info("Uploading to Supabase: %s (%.1f MB)", storage_path, final_size / (1024 * 1024))
-
-                with open(final_video, 'rb') as f:
-                    video_data = f.read()
-
-                up = requests.post(
-                    upload_url,
-                    headers={
-                        'Authorization': f'Bearer {service_role_key}',
-                        'Content-Type': 'video/mp4',
-                        'x-upsert': 'true',
-                    },
-                    data=video_data,
-                    timeout=1200,
-                )
+    })
 
-                if up.status_code not in (200, 201):
-                    log.error("Supabase upload failed: %d %s (video preserved at %s)", up.status_code, (up.text or '')[:500], backup_path)
-                    # Use VPS video endpoint so the frontend can reach the video
-                    lovable_render_jobs[job_id]['video_url'] = f"http://31.97.147.132:5001/api/video/{project_id}/{render_id}"
-                    lovable_render_jobs[job_id]['upload_error'] = f"{up.status_code}: {(up.text or '')[:300]}"
-                    # Don't raise — video is saved locally, mark as completed with warning
-                else:
-                    public_url = f"{supabase_url}/storage/v1/object/public/renders/{storage_path}"
-                    lovable_render_jobs[job_id]['video_url'] = public_url
-                    log.info("Upload OK -> %s", public_url)
-            else:
-                # No Supabase credentials — use VPS video endpoint for local serving
-                lovable_render_jobs[job_id]['video_url'] = f"http://31.97.147.132:5001/api/video/{project_id}/{render_id}"
-                log.info("No Supabase credentials, using VPS video endpoint")
-
-            lovable_render_jobs[job_id]['status'] = 'completed'
-            lovable_render_jobs[job_id]['progress'] = 100
-            lovable_render_jobs[job_id]['message'] = 'Render complete'
-            log.info("=== RENDER COMPLETE === job=%s", job_id)
-
-            # --- Update Supabase renders table directly ---
-            _update_render_in_supabase(
-                supabase_url, _sb_key, render_id,
-                status='completed',
-                video_url=lovable_render_jobs[job_id].get('video_url'),
-                log=log
-            )
+    _enqueue_render_job(job_id, data)
+    logger.info("Render job queued: job=%s project=%s", job_id, project_id)
 
-        except subprocess.TimeoutExpired as e:
-            msg = f"FFmpeg timed out after {e.timeout}s"
-            log.error("=== RENDER TIMEOUT === job=%s: %s", job_id, msg)
-            lovable_render_jobs[job_id]['status'] = 'failed'
-            lovable_render_jobs[job_id]['error'] = msg
-            lovable_render_jobs[job_id]['message'] = msg
-            _update_render_in_supabase(
-                supabase_url, _sb_key, render_id,
-                status='failed', error_message=msg, log=log
-            )
-        except Exception as e:
-            tb = traceback.format_exc()
-            log.error("=== RENDER FAILED === job=%s\n%s", job_id, tb)
-            lovable_render_jobs[job_id]['status'] = 'failed'
-            lovable_render_jobs[job_id]['error'] = str(e)
-            lovable_render_jobs[job_id]['message'] = f"Error: {e}"
-            _update_render_in_supabase(
-                supabase_url, _sb_key, render_id,
-                status='failed', error_message=str(e), log=log
-            )
-        finally:
-            # Only clean up temp dir if render completed successfully
-            if lovable_render_jobs[job_id].get('status') == 'completed' and render_dir:
-                shutil.rmtree(render_dir, ignore_errors=True)
-                log.info("Cleaned up render dir for job=%s", job_id)
-            elif render_dir:
-                log.info("Keeping render dir for failed job=%s: %s", job_id, render_dir)
-
-    t = threading.Thread(target=do_render, daemon=True)
-    t.start()
-    logger.info("Render job dispatched: job=%s project=%s", job_id, project_id)
-
-    resp = jsonify({'success': True, 'job_id': job_id})
+    token = _stream_token(job_id)
+    resp = jsonify({'success': True, 'job_id': job_id, 'stream_token': token,
+                    'events_url': f"/api/lovable-render/{job_id}/events?token={token}"})
     resp.headers['Access-Control-Allow-Origin'] = '*'
     return resp
 
@@ -1765,22 +4454,54 @@ def lovable_render_status(job_id):
     if not verify_lovable_api_key():
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
 
-    job = lovable_render_jobs.get(job_id)
+    job = _job_get(job_id)
     if not job:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
 
-    resp = jsonify({'success': True, **job})
+    # A fresh stream_token for clients that (re)open the event stream later
+    resp = jsonify({'success': True, **job, 'stream_token': _stream_token(job_id)})
     resp.headers['Access-Control-Allow-Origin'] = '*'
     return resp
 
 
+@app.route('/api/lovable-render/<job_id>/events', methods=['GET', 'OPTIONS'])
+def lovable_render_events(job_id):
+    """
+    Stream render job status as Server-Sent Events until the job finishes.
+
+    EventSource cannot send headers, so it authenticates with ?token=<stream_token>
+    from the render or status response (see _stream_token). The /status
+    endpoint remains available for polling.
+    """
+
+    # CORS preflight
+    if request.method == 'OPTIONS':
+        resp = jsonify({'status': 'ok'})
+        resp.headers['Access-Control-Allow-Origin'] = '*'
+        resp.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        resp.headers['Access-Control-Allow-Headers'] = 'Authorization, Content-Type'
+        return resp
+
+    if not (verify_lovable_api_key() or _stream_token_valid(job_id, request.args.get('token'))):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    if _job_get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    return _event_stream_response(job_id, until_finished=True, envelope=True)
+
+
+_start_render_queue()
+
+
 if __name__ == '__main__':
     print("=" * 80)
     print("🎬 YOUTUBE VIDEO ENGINE - Server Starting")
     print("=" * 80)
     print(f"Dashboard: http://0.0.0.0:5001")
-    print(f"Upload: {BASE_DIR / 'uploads'}")
-    print(f"Output: {BASE_DIR / 'output'}")
+    print(f"Upload: {UPLOAD_DIR}")
+    print(f"Output: {OUTPUT_DIR}")
+    print("Development server; in production run: gunicorn -c gunicorn.conf.py")
     print("=" * 80)
     
     try:
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the Lovable render pipeline.
+
+Builds synthetic scene images, short videos and narration audio with ffmpeg
+lavfi sources, serves them from a local HTTP server that also stands in for
+Supabase storage (TUS uploads + renders table), and runs /api/lovable-render
+through the Flask test client at several scene counts. Each scene count runs in
+its own process with its own data directories, so CPU time and peak RSS are
+not shared between runs.
+
+Prints (or writes with --output) one JSON document per invocation:
+
+    python benchmarks/bench_render.py --scenes 4,16,48 --profile draft --output before.json
+
+Stages are timed from the job's progress messages as seen by the status
+endpoint (polled every --poll seconds); the job's own stage timings are
+reported alongside as "timings".
+
+With --check the exit status also fails any run that fell back to a hard-cut
+concat or to multi_step, or whose video is not as long as its scenes. The
+grouped stitcher regression run:
+
+    python benchmarks/bench_render.py --scenes 10 --stitch-mode chunked --xfade-group-size 4 --check
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Job message prefix -> stage name, in pipeline order
+STAGE_PREFIXES = [
+    ('Queued', 'queued'),
+    ('Preparing', 'prepare'),
+    ('Downloading audio', 'download_audio'),
+    ('Downloading media', 'download_media'),
+    ('Downloaded', 'download_media'),
+    ('Rendering video (single pass)', 'single_pass'),
+    ('Rendering video segments', 'segments'),
+    ('Rendered segment', 'segments'),
+    ('Adding transitions', 'stitch'),
+    ('Adding audio', 'merge_audio'),
+    ('Adding subtitles', 'subtitles'),
+    ('Uploading', 'upload'),
+]
+
+
+def stage_for(message):
+    for prefix, stage in STAGE_PREFIXES:
+        if (message or '').startswith(prefix):
+            return stage
+    return 'other'
+
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True)
+
+
+def make_fixtures(fixture_dir: Path, scene_count, scene_seconds, video_every, width, height):
+    """One distinct image or clip per scene, plus narration audio. Returns the scene specs."""
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    source = f"testsrc2=size={width}x{height}:rate=25"
+    scenes = []
+    for i in range(scene_count):
+        # testsrc2 draws a running clock, so seeking by i makes every fixture distinct
+        if video_every and i % video_every == video_every - 1:
+            name = f"scene_{i:03d}.mp4"
+            if not (fixture_dir / name).exists():
+                ffmpeg('-f', 'lavfi', '-i', source, '-ss', str(i), '-t', str(scene_seconds + 1),
+                       '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', str(fixture_dir / name))
+            scenes.append({'video_url': name, 'duration': scene_seconds})
+        else:
+            name = f"scene_{i:03d}.png"
+            if not (fixture_dir / name).exists():
+                ffmpeg('-f', 'lavfi', '-i', source, '-ss', str(i), '-frames:v', '1', str(fixture_dir / name))
+            scenes.append({'image_url': name, 'duration': scene_seconds})
+
+    total = scene_count * scene_seconds
+    audio = fixture_dir / f"narration_{total}.mp3"
+    if not audio.exists():
+        ffmpeg('-f', 'lavfi', '-i', f"sine=frequency=220:duration={total}",
+               '-c:a', 'libmp3lame', '-b:a', '128k', str(audio))
+    return scenes, audio.name
+
+
+def make_word_timestamps(total_seconds, seed=0):
+    rng = random.Random(seed)
+    words, t = [], 0.0
+    while t < total_seconds - 1:
+        duration = rng.uniform(0.15, 0.5)
+        words.append({'word': rng.choice(['render', 'bench', 'scene', 'story.', 'frame', 'why?']),
+                      'start': round(t, 3), 'end': round(t + duration, 3)})
+        t += duration + rng.choice([0.03, 0.08, 0.3])
+    return words
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Serves /fixtures/* and fakes the Supabase endpoints the render job calls."""
+    daemon_threads = True
+
+    def __init__(self, fixture_dir):
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+        self.fixture_dir = Path(fixture_dir)
+        self.uploads = {}
+        self.bytes_served = 0
+        self.bytes_uploaded = 0
+        self.render_updates = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        remaining, received = length, 0
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            received += len(chunk)
+        with self.server.lock:
+            self.server.bytes_uploaded += received
+        return received
+
+    def do_GET(self):
+        if not self.path.startswith('/fixtures/'):
+            return self._reply(404)
+        path = self.server.fixture_dir / Path(self.path[len('/fixtures/'):]).name
+        if not path.is_file():
+            return self._reply(404)
+        size = path.stat().st_size
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+        with self.server.lock:
+            self.server.bytes_served += size
+
+    def do_HEAD(self):
+        upload_id = self.path.rsplit('/', 1)[-1]
+        offset = self.server.uploads.get(upload_id)
+        if offset is None:
+            return self._reply(404)
+        self._reply(200, headers={'Upload-Offset': str(offset), 'Tus-Resumable': '1.0.0'})
+
+    def do_POST(self):
+        if self.path.startswith('/storage/v1/upload/resumable'):
+            self._read_body()
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = 0
+            return self._reply(201, headers={'Location': f"/storage/v1/upload/resumable/{upload_id}",
+                                             'Tus-Resumable': '1.0.0'})
+        self._read_body()
+        self._reply(200, b'{"Key": "bench"}', {'Content-Type': 'application/json'})
+
+    def do_PATCH(self):
+        if self.path.startswith('/storage/v1/upload/resumable/'):
+            upload_id = self.path.rsplit('/', 1)[-1]
+            if upload_id not in self.server.uploads:
+                return self._reply(404)
+            received = self._read_body()
+            self.server.uploads[upload_id] += received
+            return self._reply(204, headers={'Upload-Offset': str(self.server.uploads[upload_id]),
+                                             'Tus-Resumable': '1.0.0'})
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        with self.server.lock:
+            self.server.render_updates.append(json.loads(body or b'{}'))
+        self._reply(204)
+
+
+def rusage_snapshot():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'cpu': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        'own_user': own.ru_utime, 'own_system': own.ru_stime,
+        'children_user': children.ru_utime, 'children_system': children.ru_stime,
+    }
+
+
+def run_single(args, scene_count, result_path):
+    """Run one render in this process (data dirs under --workdir) and write the result JSON."""
+    workdir = Path(args.workdir)
+    fixture_dir = Path(args.fixtures)
+    scenes, audio_name = make_fixtures(fixture_dir, scene_count, args.scene_seconds,
+                                       args.video_every, args.fixture_width, args.fixture_height)
+
+    data_dir = workdir / f"run_{scene_count}"
+    os.environ['YVE_UPLOAD_DIR'] = str(data_dir / 'uploads')
+    os.environ['YVE_OUTPUT_DIR'] = str(data_dir / 'output')
+    os.environ['YVE_STATE_DB'] = str(data_dir / 'yve_state.db')
+    os.environ['YVE_SEGMENT_CACHE_DIR'] = str(data_dir / 'segment_cache')
+    os.environ.pop('SUPABASE_SERVICE_ROLE_KEY', None)
+    if args.xfade_group_size:
+        os.environ['YVE_XFADE_GROUP_SIZE'] = str(args.xfade_group_size)
+    sys.path.insert(0, str(REPO_DIR))
+    import backend_server
+
+    server = FixtureServer(fixture_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fixtures_url = f"{server.base_url}/fixtures"
+    payload = {
+        'project_id': f"bench-{scene_count}",
+        'render_id': uuid.uuid4().hex,
+        'scenes': [{k: (f"{fixtures_url}/{v}" if k.endswith('_url') else v) for k, v in sc.items()}
+                   for sc in scenes],
+        'audio_url': f"{fixtures_url}/{audio_name}",
+        'supabase_url': server.base_url,
+        'supabase_key': 'bench',
+        'profile': args.profile,
+        'incremental': False,
+    }
+    if args.subtitles:
+        payload['word_timestamps'] = make_word_timestamps(scene_count * args.scene_seconds)
+    if args.stitch_mode:
+        payload['stitch_mode'] = args.stitch_mode
+    if args.render_mode:
+        payload['render_mode'] = args.render_mode
+
+    client = backend_server.app.test_client()
+    auth = {'Authorization': f"Bearer {backend_server.VPS_API_KEY}"}
+    before = rusage_snapshot()
+    started = time.perf_counter()
+    resp = client.post('/api/lovable-render', json=payload, headers=auth)
+    job_id = resp.get_json()['job_id']
+
+    stages = {}
+    current, stage_started, stage_cpu = None, started, before['cpu']
+    job = {}
+    while True:
+        job = client.get(f"/api/lovable-render/{job_id}/status", headers=auth).get_json()
+        now, usage = time.perf_counter(), rusage_snapshot()
+        stage = stage_for(job.get('message')) if job.get('status') not in ('completed', 'failed') else None
+        if stage != current:
+            if current is not None:
+                entry = stages.setdefault(current, {'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+                entry['wall_seconds'] += now - stage_started
+                entry['cpu_seconds'] += usage['cpu'] - stage_cpu
+            current, stage_started, stage_cpu = stage, now, usage['cpu']
+        if job.get('status') in ('completed', 'failed'):
+            break
+        if now - started > args.timeout:
+            job = {**job, 'status': 'timeout'}
+            break
+        time.sleep(args.poll)
+
+    wall = time.perf_counter() - started
+    after = rusage_snapshot()
+    own_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    local_path = job.get('local_path')
+    result = {
+        'scenes': scene_count,
+        'seconds_of_video': scene_count * args.scene_seconds,
+        'status': job.get('status'),
+        'error': job.get('error'),
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(after['cpu'] - before['cpu'], 3),
+        'cpu_user_seconds': round(after['own_user'] - before['own_user']
+                                  + after['children_user'] - before['children_user'], 3),
+        'cpu_system_seconds': round(after['own_system'] - before['own_system']
+                                    + after['children_system'] - before['children_system'], 3),
+        'ffmpeg_cpu_seconds': round(after['children_user'] + after['children_system']
+                                    - before['children_user'] - before['children_system'], 3),
+        # ru_maxrss is in KiB on Linux; children is the largest single ffmpeg process
+        'peak_rss_mb': round(own_peak / 1024, 1),
+        'ffmpeg_peak_rss_mb': round(children_peak / 1024, 1),
+        'stages': {k: {m: round(v, 3) for m, v in e.items()} for k, e in stages.items()},
+        'video_bytes': Path(local_path).stat().st_size if local_path and Path(local_path).exists() else None,
+        'video_seconds': probe_seconds(local_path) if local_path and Path(local_path).exists() else None,
+        'bytes_downloaded': server.bytes_served,
+        'bytes_uploaded': server.bytes_uploaded,
+    }
+    for key in ('render_mode', 'render_fallback', 'stitch_fallback', 'segment_cache', 'upload', 'timings'):
+        if key in job:
+            result[key] = job[key]
+    server.shutdown()
+    Path(result_path).write_text(json.dumps(result), encoding='utf-8')
+
+
+def probe_seconds(path):
+    try:
+        out = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                              '-of', 'default=nw=1:nk=1', str(path)], capture_output=True, text=True, check=True)
+        return round(float(out.stdout.strip()), 3)
+    except Exception:
+        return None
+
+
+def run_problems(run):
+    """Why a run fails --check (empty if it passes)."""
+    problems = []
+    if run.get('status') != 'completed':
+        problems.append(f"status {run.get('status')}")
+    for key in ('render_fallback', 'stitch_fallback'):
+        if run.get(key):
+            problems.append(f"{key}: {run[key]}")
+    seconds = run.get('video_seconds')
+    if run.get('status') == 'completed' and (seconds is None or abs(seconds - run['seconds_of_video']) > 0.1):
+        problems.append(f"video is {seconds}s, scenes add up to {run['seconds_of_video']}s")
+    return problems
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', '-C', str(REPO_DIR), 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenes', default='4,12,32', help='comma-separated scene counts')
+    parser.add_argument('--scene-seconds', type=int, default=4)
+    parser.add_argument('--video-every', type=int, default=4, help='every Nth scene is a video clip (0: images only)')
+    parser.add_argument('--fixture-width', type=int, default=1280)
+    parser.add_argument('--fixture-height', type=int, default=720)
+    parser.add_argument('--profile', default='draft')
+    parser.add_argument('--stitch-mode', default=None)
+    parser.add_argument('--render-mode', default=None)
+    parser.add_argument('--xfade-group-size', type=int, default=None, help='override YVE_XFADE_GROUP_SIZE')
+    parser.add_argument('--check', action='store_true',
+                        help='fail on crossfade/render fallbacks and on videos shorter or longer than the scenes')
+    parser.add_argument('--no-subtitles', dest='subtitles', action='store_false')
+    parser.add_argument('--poll', type=float, default=0.05)
+    parser.add_argument('--timeout', type=float, default=3600)
+    parser.add_argument('--workdir', default=None, help='kept after the run if given')
+    parser.add_argument('--fixtures', default=None, help='fixture cache directory (default: inside workdir)')
+    parser.add_argument('--output', default=None, help='write the JSON report here instead of stdout')
+    parser.add_argument('--single', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        run_single(args, args.single, args.result)
+        return 0
+
+    if not shutil.which('ffmpeg'):
+        print('ffmpeg not found on PATH', file=sys.stderr)
+        return 1
+
+    keep = args.workdir is not None
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='yve-bench-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    fixtures = Path(args.fixtures) if args.fixtures else workdir / 'fixtures'
+
+    runs = []
+    try:
+        for count in [int(c) for c in args.scenes.split(',') if c.strip()]:
+            result_path = workdir / f"result_{count}.json"
+            log_path = workdir / f"render_{count}.log"
+            cmd = [sys.executable, __file__, *sys.argv[1:],
+                   '--single', str(count), '--result', str(result_path),
+                   '--workdir', str(workdir), '--fixtures', str(fixtures)]
+            print(f"Rendering {count} scenes...", file=sys.stderr)
+            with open(log_path, 'w') as log:
+                rc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT).returncode
+            if rc != 0 or not result_path.exists():
+                runs.append({'scenes': count, 'status': 'crashed', 'log': str(log_path) if keep else None})
+                continue
+            runs.append(json.loads(result_path.read_text(encoding='utf-8')))
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    ffmpeg_version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.splitlines()
+    report = {
+        'revision': git_revision(),
+        'ffmpeg': ffmpeg_version[0] if ffmpeg_version else None,
+        'cpu_count': os.cpu_count(),
+        'profile': args.profile,
+        'stitch_mode': args.stitch_mode,
+        'xfade_group_size': args.xfade_group_size,
+        'render_mode': args.render_mode,
+        'subtitles': args.subtitles,
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    if args.check:
+        failed = False
+        for run in runs:
+            for problem in run_problems(run):
+                print(f"FAIL {run['scenes']} scenes: {problem}", file=sys.stderr)
+                failed = True
+        return 1 if failed else 0
+    return 0 if all(r.get('status') == 'completed' for r in runs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark ASS subtitle generation: pure-Python grouping vs the NumPy path.
+
+Generates a synthetic narration (default 20k words, about two hours), writes
+the ASS file with both implementations, checks the files are byte-identical
+and prints the timings as JSON. Exits 1 if the outputs differ.
+
+    python benchmarks/bench_subtitles.py --words 20000 --repeat 5
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import backend_server  # noqa: E402
+
+VOCABULARY = ['the', 'a', 'video', 'story', 'and', 'then', 'we', 'saw', 'it', 'really',
+              'incredible', 'moment.', 'why?', 'yes!', '{note}', 'back\\slash', 'again,']
+
+
+def make_words(count, seed):
+    rng = random.Random(seed)
+    words, t = [], 0.0
+    for _ in range(count):
+        duration = rng.uniform(0.12, 0.6)
+        words.append({'word': rng.choice(VOCABULARY), 'start': t, 'end': t + duration})
+        t += duration + rng.choice([0.02, 0.05, 0.1, 0.4])
+    return words
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if backend_server.np is None:
+        print('numpy is not installed; nothing to compare', file=sys.stderr)
+        return 1
+
+    words = make_words(args.words, args.seed)
+    numpy_module = backend_server.np
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        results = {}
+        for name, module in (('python', None), ('numpy', numpy_module)):
+            path = Path(tmp) / f"{name}.ass"
+            backend_server.np = module
+            try:
+                results[name] = best_of(
+                    args.repeat, lambda: backend_server._generate_ass_subtitles(words, str(path))
+                )
+            finally:
+                backend_server.np = numpy_module
+            outputs[name] = path.read_bytes()
+
+    identical = outputs['python'] == outputs['numpy']
+    print(json.dumps({
+        'words': args.words,
+        'subtitles': outputs['numpy'].count(b'\nDialogue: '),
+        'python_seconds': round(results['python'], 5),
+        'numpy_seconds': round(results['numpy'], 5),
+        'speedup': round(results['python'] / results['numpy'], 2),
+        'byte_identical': identical,
+    }, indent=2))
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
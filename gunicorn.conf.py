@@ -0,0 +1,57 @@
+"""
+Production server for backend_server.py (instead of the Werkzeug dev server):
+
+    pip install -r requirements.txt
+    gunicorn -c gunicorn.conf.py
+
+gthread workers: each SSE progress stream or large upload/download holds one
+thread for as long as it runs. Every process gets YVE_WEB_THREADS threads for
+ordinary requests plus YVE_SSE_STREAMS for progress streams; the app caps open
+streams at YVE_SSE_STREAMS per process (503 beyond that, clients poll instead),
+so streams cannot starve the API.
+
+State shared between worker processes:
+- Job state and the render queue live in the SQLite state DB. Each worker
+  pulls rows written by the others into its cache.
+- Exactly one worker runs the render queue, as the holder of an flock. If it
+  exits, another worker takes over and re-queues its unfinished job.
+- The project index re-reads projects/ when the directory changes.
+
+/metrics is per process: counters reflect the worker that served the scrape.
+"""
+import multiprocessing
+import os
+import uuid
+
+wsgi_app = 'backend_server:app'
+bind = os.environ.get('YVE_BIND', '0.0.0.0:5001')
+
+worker_class = 'gthread'
+workers = int(os.environ.get('YVE_WEB_WORKERS', min(4, multiprocessing.cpu_count())))
+threads = int(os.environ.get('YVE_WEB_THREADS', '16')) + int(os.environ.get('YVE_SSE_STREAMS', '48'))
+
+# gthread workers heartbeat independently of requests, so long downloads and
+# SSE streams are not killed by this
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
+
+# Never recycle workers: the one holding the render queue would drop its job
+max_requests = 0
+# Import the app in each worker, not the master: its background threads
+# (render queue, job sync) do not survive fork
+preload_app = False
+
+# Read by the deploy script to stop this server before starting the next
+pidfile = os.environ.get('YVE_PIDFILE', 'gunicorn.pid')
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('YVE_LOG_LEVEL', 'info')
+
+# Read by backend_server as SERVER_BOOT_ID: start-up recovery runs once per
+# server start, not once per worker (re)spawn
+os.environ['YVE_BOOT_ID'] = uuid.uuid4().hex
+# Read by backend_server as SERVER_SECRET: every worker must be able to open
+# credentials sealed into the render queue by another one
+os.environ.setdefault('YVE_SERVER_SECRET', os.urandom(32).hex())